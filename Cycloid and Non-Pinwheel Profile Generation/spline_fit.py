@@ -0,0 +1,85 @@
+'''
+Error-bounded B-spline fitting of the generated profiles for DXF export.
+
+Passing every generated point as a fit point gives thousands of points per lobe. Here a
+clamped cubic B-spline is fitted by least squares, and knots are added where the fit is
+worst until every profile point lies within the tolerance. The spline is exported with
+its control points and knots, so every CAD package reconstructs exactly the same curve.
+
+The deviation is measured from each profile point to the spline at the point's own
+(chord length) parameter, which is never smaller than the true normal distance.
+'''
+
+import numpy as np
+
+
+# B-spline basis functions (Cox-de Boor) for all parameters u at once
+# returns a matrix of shape (len(u), len(knots)-degree-1)
+def bspline_basis(u, knots, degree):
+	u = np.asarray(u, dtype=float)
+	knots = np.asarray(knots, dtype=float)
+
+	# degree 0, the last parameter belongs to the last non-empty span
+	basis = ((knots[:-1] <= u[:, np.newaxis]) & (u[:, np.newaxis] < knots[1:])).astype(float)
+	last = np.nonzero(knots[:-1] < knots[1:])[0][-1]
+	basis[u >= knots[-1], :] = 0
+	basis[u >= knots[-1], last] = 1
+
+	for p in range(1, degree+1):
+		n = len(knots) - p - 1
+		left_den = knots[p:p+n] - knots[:n]
+		right_den = knots[p+1:p+1+n] - knots[1:n+1]
+		with np.errstate(divide='ignore', invalid='ignore'):
+			left = np.where(left_den > 0, (u[:, np.newaxis] - knots[:n]) / left_den, 0)
+			right = np.where(right_den > 0, (knots[p+1:p+1+n] - u[:, np.newaxis]) / right_den, 0)
+		basis = left * basis[:, :n] + right * basis[:, 1:n+1]
+
+	return basis
+
+
+# Least squares fit with fixed knots, the end points are interpolated exactly
+def fit_with_knots(points, u, knots, degree):
+	basis = bspline_basis(u, knots, degree)
+
+	control = np.zeros((basis.shape[1], points.shape[1]))
+	control[0] = points[0]
+	control[-1] = points[-1]
+
+	rhs = points - np.outer(basis[:, 0], control[0]) - np.outer(basis[:, -1], control[-1])
+	control[1:-1] = np.linalg.lstsq(basis[:, 1:-1], rhs, rcond=None)[0]
+
+	error = np.linalg.norm(basis @ control - points, axis=1)
+	return (control, error)
+
+
+# Fit a clamped B-spline through an ordered list of points, adding knots until the
+# deviation is within tolerance [mm]. Returns (control_points, knots, max_deviation).
+def fit_bspline(points, tolerance, degree=3, max_control_points=1000):
+	points = np.asarray(points, dtype=float)
+
+	# chord length parametrisation on [0, 1]
+	chords = np.linalg.norm(np.diff(points, axis=0), axis=1)
+	u = np.concatenate(([0], np.cumsum(chords))) / np.sum(chords)
+
+	interior = list(np.linspace(0, 1, 3)[1:-1])
+	while True:
+		knots = np.concatenate(([0]*(degree+1), interior, [1]*(degree+1)))
+		(control, error) = fit_with_knots(points, u, knots, degree)
+		if error.max() <= tolerance or len(control) >= max_control_points:
+			break
+
+		# split the knot span holding the worst point
+		span = np.searchsorted(knots, u[np.argmax(error)], side='right') - 1
+		span = min(span, len(knots) - degree - 2)
+		interior.append(0.5 * (knots[span] + knots[span+1]))
+		interior.sort()
+
+	return (control, knots, error.max())
+
+
+# Add a profile to a DXF modelspace as a fitted spline, returns the spline entity, the
+# number of control points and the achieved deviation [mm]
+def add_fitted_spline(msp, points, tolerance, degree=3, dxfattribs=None):
+	(control, knots, deviation) = fit_bspline(points, tolerance, degree)
+	spline = msp.add_open_spline(control, degree=degree, knots=knots, dxfattribs=dxfattribs)
+	return (spline, len(control), deviation)
@@ -0,0 +1,180 @@
+'''
+Kinematic transmission error of a cycloidal disk running in a fixed pinwheel.
+
+The disk profile is taken as the point list from generate_disk (or any other closed
+profile, e.g. one with a modified roller radius) and the pinwheel is given by its own
+roller radius, so profile modifications, clearances and the effective pin radius of the
+conic and split-pinwheel variants can all be evaluated.
+
+For a sweep of input (eccentric) angles, the disk rotation is solved from profile
+contact for both flanks at once. All angles are in radians; output angles are disk
+rotations, so they compare directly against the output POSITION of the actuator.
+'''
+
+import math
+import numpy as np
+
+
+# Polar lookup table of the curve a pin center has to stay outside of.
+# This is the disk profile offset outwards by the pin radius, which is assumed to be
+# star-shaped around the disk center (true unless the pins are much larger than the
+# roller radius the profile was generated with).
+def pin_center_boundary(points, Rr):
+	points = np.asarray(points, dtype=float)
+
+	# drop the duplicated closing point and other zero length segments
+	keep = np.linalg.norm(points - np.roll(points, 1, axis=0), axis=1) > 1e-12
+	points = points[keep]
+
+	# tangent by central differences on the closed curve
+	tangent = np.roll(points, -1, axis=0) - np.roll(points, 1, axis=0)
+	tangent /= np.linalg.norm(tangent, axis=1)[:, np.newaxis]
+
+	# outward normal, depending on the orientation of the profile (shoelace area)
+	x, y = points[:, 0], points[:, 1]
+	area = 0.5 * np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)
+	normal = np.column_stack((tangent[:, 1], -tangent[:, 0]))
+	if area < 0:
+		normal = -normal
+
+	boundary = points + Rr * normal
+	angle = np.arctan2(boundary[:, 1], boundary[:, 0])
+	radius = np.hypot(boundary[:, 0], boundary[:, 1])
+
+	order = np.argsort(angle)
+	return (angle[order], radius[order])
+
+
+# Radial clearance of every pin to the boundary for the disk at input angle theta and
+# disk rotation phi. theta and phi broadcast against each other, the pins are added
+# as the last axis. Negative values mean interference.
+def pin_gaps(boundary, theta, phi, R, N, E):
+	(angle, radius) = boundary
+
+	zeta = 2 * math.pi * np.arange(N) / N
+	theta = np.asarray(theta)[..., np.newaxis]
+	phi = np.asarray(phi)[..., np.newaxis]
+
+	# pin centers relative to the eccentric disk center
+	px = R * np.cos(zeta) - E * np.cos(theta)
+	py = R * np.sin(zeta) - E * np.sin(theta)
+
+	# ...and expressed in the rotated disk frame as polar coordinates
+	r = np.hypot(px, py)
+	alpha = np.arctan2(py, px) - phi
+
+	return r - np.interp(alpha, angle, radius, period=2*math.pi)
+
+
+# Solve the disk rotation at which the profile first touches a pin when rotating away
+# from phi_nom in the given direction (+1 or -1). Returns the offset from phi_nom, nan
+# where the disk interferes with the pins by more than tolerance [mm] at phi_nom.
+def solve_flank(boundary, theta, phi_nom, R, N, E, direction, span, tolerance=1e-4, scan_steps=64, iterations=40):
+	steps = np.linspace(0, span, scan_steps+1)
+
+	# coarse scan for the first step in which a pin is touched
+	gaps = pin_gaps(boundary, theta[:, np.newaxis], phi_nom[:, np.newaxis] + direction*steps, R, N, E)
+	gaps = gaps.min(axis=-1)
+	touching = gaps <= 0
+	touching[:, 0] = gaps[:, 0] <= -tolerance	# an exact fit is not interference
+	first = np.argmax(touching, axis=1)
+	valid = touching.any(axis=1) & (first > 0)
+
+	first = np.maximum(first, 1)
+	lower = steps[first-1]
+	upper = steps[first]
+
+	# refine the bracket by bisection, all input angles at once
+	for _ in range(iterations):
+		middle = 0.5 * (lower + upper)
+		touches = pin_gaps(boundary, theta, phi_nom + direction*middle, R, N, E).min(axis=-1) <= 0
+		upper = np.where(touches, middle, upper)
+		lower = np.where(touches, lower, middle)
+
+	offset = 0.5 * (lower + upper)
+	offset[~valid] = np.nan
+	return offset
+
+
+# Transmission error of the disk profile over one input revolution.
+# Returns the input angles and the output angle error for positive and negative
+# rotation (each flank loaded), relative to the ideal 1/(N-1) motion. The errors are
+# centered on the mean position, so te_pos - te_neg is the lost motion at each angle.
+def transmission_error(points, R, N, E, Rr, num_angles=2048, span=None, tolerance=1e-4):
+	boundary = pin_center_boundary(points, Rr)
+	if span is None:
+		span = math.pi / (N-1) / 2		# a quarter of a lobe
+
+	theta = np.linspace(0, 2*math.pi, num_angles, endpoint=False)
+
+	# nominal phase: a valley of the disk faces the eccentric at theta = 0
+	points = np.asarray(points, dtype=float)
+	valley = np.argmin(np.hypot(points[:, 0], points[:, 1]))
+	phi_0 = -math.atan2(points[valley, 1], points[valley, 0])
+	phi_ideal = phi_0 - theta / (N-1)
+
+	offset_pos = solve_flank(boundary, theta, phi_ideal, R, N, E, +1, span, tolerance)
+	offset_neg = -solve_flank(boundary, theta, phi_ideal, R, N, E, -1, span, tolerance)
+
+	center = 0.5 * (offset_pos + offset_neg)
+	center = np.nanmean(center) if np.isfinite(center).any() else 0.0
+	return (theta, offset_pos - center, offset_neg - center)
+
+
+# Amplitude spectrum of an error signal in orders of the input rotation.
+# theta does not have to be uniform or sorted (measured data), the error is resampled
+# onto whole input revolutions before the FFT.
+def order_spectrum(theta, error, samples_per_rev=1024):
+	theta = np.asarray(theta, dtype=float)
+	error = np.asarray(error, dtype=float)
+
+	valid = np.isfinite(theta) & np.isfinite(error)
+	order = np.argsort(theta[valid])
+	theta = theta[valid][order]
+	error = error[valid][order]
+
+	revolutions = max(1, int((theta[-1] - theta[0]) // (2*math.pi)))
+	n = revolutions * samples_per_rev
+	theta_uniform = theta[0] + np.arange(n) * 2*math.pi / samples_per_rev
+	if theta[-1] - theta[0] >= 2*math.pi:
+		error_uniform = np.interp(theta_uniform, theta, error)
+	else:
+		# a single (predicted) revolution, which is periodic by definition
+		error_uniform = np.interp(theta_uniform, theta, error, period=2*math.pi)
+
+	spectrum = np.fft.rfft(error_uniform - error_uniform.mean())
+	amplitude = 2 * np.abs(spectrum) / n
+	orders = np.arange(len(spectrum)) / revolutions
+
+	return (orders, amplitude)
+
+
+# Input angle and position error from a recorded trajectory (output revolutions, as
+# stored by record_trajectory.py), in the same units as transmission_error.
+def measured_error(df, N, reference='CONTROL_POSITION'):
+	theta = df['POSITION'].to_numpy() * 2*math.pi * (N-1)
+	error = (df['POSITION'] - df[reference]).to_numpy() * 2*math.pi
+	return (theta, error)
+
+
+# Print out transmission error summary
+def te_info(theta, te_pos, te_neg, harmonics=5):
+	arcmin = 60 * 180 / math.pi
+
+	print('Transmission error over one input revolution:')
+	if np.isnan(te_pos).all() and np.isnan(te_neg).all():
+		print('    disk interferes with the pins at every input angle')
+		return
+
+	for name, te in (('positive', te_pos), ('negative', te_neg)):
+		if np.isnan(te).any():
+			print(f'    {name} flank: interference at {np.isnan(te).sum()} of {len(te)} input angles')
+			continue
+		print(f'    {name} flank: {np.ptp(te)*arcmin:.3f} arcmin peak-to-peak')
+
+	print(f'    lost motion: {np.nanmean(te_pos - te_neg)*arcmin:.3f} arcmin')
+
+	(orders, amplitude) = order_spectrum(theta, np.nan_to_num(te_pos))
+	print('    largest harmonics (positive flank):')
+	for k in np.argsort(amplitude[1:])[::-1][:harmonics] + 1:
+		print(f'        order {orders[k]:g}: {amplitude[k]*arcmin:.4f} arcmin')
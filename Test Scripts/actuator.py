@@ -4,6 +4,8 @@ import asyncio
 import moteus
 import time
 
+from tracing import Tracer
+
 
 STORED_DATA = {
     'POSITION',  'COMMAND_POSITION', 'CONTROL_POSITION',
@@ -12,9 +14,40 @@ STORED_DATA = {
 }
 
 
+class SystemClock:
+    # the clocks used by the test loops, a replay substitutes the recorded time
+    def time(self):
+        return time.time()
+
+    def time_ns(self):
+        return time.time_ns()
+
+    def monotonic_ns(self):
+        return time.monotonic_ns()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+
 class Actuator:
-    def __init__(self, actuator_id=1, stored_data=STORED_DATA, qr=None):
+    def __init__(self, actuator_id=1, stored_data=STORED_DATA, qr=None, controller=None):
         self.stored_data = stored_data
+        self.registers = [(register, moteus.Register[register]) for register in stored_data]
+        self.telemetry = None
+        self.monitor_process = None
+        self.tracer = None
+
+        # a given controller replaces the rig, e.g. replay.ReplayController. There is no
+        # diagnostic stream then, so the position bounds are left untouched
+        if controller is not None:
+            self.m = controller
+            self.s = None
+            self.clock = getattr(controller, 'clock', SystemClock())
+            self.old_position_min = math.nan
+            self.old_position_max = math.nan
+            return
+
+        self.clock = SystemClock()
         self.m = self.start_actuator(actuator_id)
         self.s = moteus.Stream(self.m, verbose=True)
 
@@ -53,6 +86,9 @@ class Actuator:
         return m
     
     async def set_position(self, position=math.nan, velocity=math.nan, **kwargs):
+        if self.tracer is not None:
+            return await self.traced_set_position(position, velocity, **kwargs)
+
         results = await self.m.set_position(
             position=position,
             velocity=velocity,
@@ -60,6 +96,42 @@ class Actuator:
             query=True,
         )
         return results
+
+    async def traced_set_position(self, position=math.nan, velocity=math.nan, **kwargs):
+        # same as set_position, with the frame encoding, bus round trip and reply parsing timed separately
+        start = time.perf_counter_ns()
+        command = self.m.make_position(
+            position=position,
+            velocity=velocity,
+            **kwargs,
+            query=True,
+        )
+        encoded = time.perf_counter_ns()
+
+        # the reply is parsed inside the transport cycle, wrap the parser to split it off
+        parse_ns = 0
+        parse = getattr(command, 'parse', None)
+        if parse is not None:
+            def timed_parse(*args, **kwargs):
+                nonlocal parse_ns
+                parse_start = time.perf_counter_ns()
+                result = parse(*args, **kwargs)
+                parse_ns += time.perf_counter_ns() - parse_start
+                return result
+            command.parse = timed_parse
+
+        results = await self.m.execute(command)
+        done = time.perf_counter_ns()
+
+        self.tracer.record('encode', start, encoded)
+        self.tracer.record('transport', encoded, done - parse_ns)
+        if parse is not None:
+            self.tracer.record('parse', done - parse_ns, done)
+        return results
+
+    def enable_tracing(self, max_events=1_000_000):
+        self.tracer = Tracer(max_events)
+        return self.tracer
     
     async def slow_down(self):
         await self.m.set_position_wait_complete(
@@ -87,6 +159,8 @@ class Actuator:
         return float(response.decode('utf8'))
     
     async def set_position_bounds(self, upper=None, lower=None):
+        if self.s is None:
+            return
         upper = upper or self.old_position_max
         lower = lower or self.old_position_min
 
@@ -95,7 +169,36 @@ class Actuator:
         await self.s.command(f'conf write'.encode('utf8'))
         
     def state_to_dict(self, state, timestamp=None):
-        state_dict = {'TIME': timestamp or time.time()}
-        for register in self.stored_data:
-            state_dict[register] = state.values[moteus.Register[register]]
+        if self.tracer is not None:
+            start = time.perf_counter_ns()
+
+        state_dict = {'TIME': self.clock.time() if timestamp is None else timestamp}
+        for register, key in self.registers:
+            state_dict[register] = state.values[key]
+        if self.telemetry is not None:
+            self.telemetry.write(state_dict)
+
+        if self.tracer is not None:
+            self.tracer.record('state_to_dict', start, time.perf_counter_ns())
         return state_dict
+
+    def start_monitor(self, window=30.0, size=2**16):
+        # live plots in a separate process, fed with every state passed through state_to_dict.
+        # Imported here, numpy and the shared memory buffer are only needed with the monitor
+        from telemetry import start_monitor
+        self.telemetry, self.monitor_process = start_monitor(self.stored_data, size=size, window=window)
+
+    def stop_monitor(self):
+        if self.telemetry is None:
+            return
+        telemetry, self.telemetry = self.telemetry, None
+        self.monitor_process.terminate()
+        self.monitor_process.join()
+        telemetry.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # also stop the monitor process when a test exits halfway
+        self.stop_monitor()
@@ -0,0 +1,265 @@
+'''
+Hardware free benchmarks of the hot paths, tracked over time.
+
+    profile     generate_disk / generate_outer_profile from the profile notebook, runtime
+                and point count per design
+    telemetry   prep_query_resolution, state_to_dict per sample, with and without the
+                shared memory telemetry buffer of the live monitor
+    dataframe   building a DataFrame from recorded states, writing and reading the CSV
+    analysis    the rolling averages and conversions of the analysis notebooks
+
+Every run is appended to benchmark_history.jsonl, one JSON object per line with the commit,
+the time and all results. A run fails (exit code 1, not saved) when a timing is more than
+TOLERANCE slower than the median of the last runs, or when a point count changed.
+--accept saves such a run anyway, as the new baseline.
+
+    python benchmark.py
+    python benchmark.py profile telemetry --samples 100000
+    python benchmark.py --accept
+'''
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import tempfile
+import argparse
+import datetime
+import subprocess
+import contextlib
+
+import numpy as np
+import pandas as pd
+
+from replay import replay_actuator
+from calibration import calibrated_motor_temperature
+from telemetry import TelemetryBuffer
+
+
+HISTORY_FILE = 'benchmark_history.jsonl'
+HISTORY_WINDOW = 5      # runs in the baseline median
+TOLERANCE = 0.25        # allowed slowdown before a timing counts as regression
+
+NOTEBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                        'Cycloid and Non-Pinwheel Profile Generation', 'cycloidal profile to dxf.ipynb')
+
+# the designs of the exported profiles
+DESIGNS = {f'Rr{Rr}': dict(R=34, N=14, No=6, Rr=Rr, Ro=6.5/2, Lo=34*0.6, E=1.5, Re=10, maxDist=0.01)
+           for Rr in (3.1, 3.5, 3.9)}
+
+STORED_DATA = [ 'POSITION', 'CONTROL_POSITION', 'COMMAND_POSITION',
+                'VELOCITY', 'CONTROL_VELOCITY', 'COMMAND_VELOCITY',
+                'TORQUE', 'CONTROL_TORQUE', 'Q_CURRENT',
+                'FAULT', 'TRAJECTORY_COMPLETE',
+                'TEMPERATURE', 'MOTOR_TEMPERATURE',
+]
+
+
+def measure(func, repeat=3, min_time=0.2):
+    # seconds per call, best of repeat. Short functions are called in a loop of at least
+    # min_time, so timer resolution and single hiccups do not count as regressions
+    start = time.perf_counter()
+    func()
+    number = max(1, int(min_time / max(time.perf_counter() - start, 1e-9)))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return min(times)
+
+
+def load_profile_generation():
+    # the profile generation is defined in the notebook, run its definitions cell
+    with open(NOTEBOOK, encoding='utf8') as f:
+        cells = json.load(f)['cells']
+    namespace = {'np': np, 'math': math}
+    exec(''.join(cells[1]['source']), namespace)
+    return namespace
+
+
+def bench_profile(args):
+    results = {}
+    nb = load_profile_generation()
+    for name, params in DESIGNS.items():
+        design = nb['cycloidal_design'](**params)
+        # the outer profile prints warnings at the lobe ends
+        with contextlib.redirect_stdout(io.StringIO()):
+            (points, num_points) = nb['generate_disk'](design)
+            (points_outer, num_points_outer, _) = nb['generate_outer_profile'](design)
+            results[f'profile.disk.{name}'] = (measure(lambda: nb['generate_disk'](design)), 's')
+            results[f'profile.outer.{name}'] = (measure(lambda: nb['generate_outer_profile'](design)), 's')
+        results[f'profile.disk.{name}.points'] = (len(points), 'count')
+        results[f'profile.outer.{name}.points'] = (len(points_outer), 'count')
+    return results
+
+
+def bench_telemetry(args):
+    results = {}
+    # an Actuator on a replayed recording of random states, only the data path
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(10_000, len(STORED_DATA))), columns=STORED_DATA)
+    df['TIME'] = np.arange(len(df)) * 0.002
+    actuator = replay_actuator(df)
+    results['telemetry.prep_query_resolution'] = (measure(actuator.prep_query_resolution), 's')
+
+    states = list(actuator.m.recorded_results())
+    n = min(args.samples, 100_000)
+
+    def convert():
+        for i in range(n):
+            actuator.state_to_dict(states[i % len(states)], i)
+
+    results['telemetry.state_to_dict'] = (measure(convert) / n, 's')
+
+    actuator.telemetry = TelemetryBuffer(actuator.stored_data, 2**16)
+    try:
+        results['telemetry.state_to_dict.monitor'] = (measure(convert) / n, 's')
+    finally:
+        actuator.telemetry.close()
+        actuator.telemetry = None
+    return results
+
+
+def recorded_states(n):
+    # n samples of a recorded test, as returned by state_to_dict
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(n, len(STORED_DATA)))
+    values[:, STORED_DATA.index('FAULT')] = 0
+    t = time.monotonic_ns() + np.arange(n) * 2_000_000
+    return [dict(TIME=int(t[i]), **dict(zip(STORED_DATA, values[i].tolist()))) for i in range(n)]
+
+
+def bench_dataframe(args):
+    results = {}
+    states = recorded_states(args.samples)
+    results['dataframe.build'] = (measure(lambda: pd.DataFrame(states), args.repeat), 's')
+    df = pd.DataFrame(states)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'bench.csv')
+        results['dataframe.to_csv'] = (measure(lambda: df.to_csv(filename, index=False), args.repeat), 's')
+        results['dataframe.read_csv'] = (measure(lambda: pd.read_csv(filename), args.repeat), 's')
+    return results
+
+
+def bench_analysis(args):
+    results = {}
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'TIME': np.arange(args.samples) * 0.002,
+        'POSITION': np.cumsum(rng.normal(size=args.samples)) * 1e-4,
+        'TORQUE': rng.normal(size=args.samples),
+        'MOTOR_TEMPERATURE': rng.uniform(60, 180, size=args.samples),
+    })
+
+    # analyse_performance.ipynb
+    results['analysis.rolling_500'] = (measure(lambda: df['TORQUE'].rolling(window=500, center=True).mean(), args.repeat), 's')
+    results['analysis.rolling_5'] = (measure(lambda: df['TORQUE'].rolling(window=5, center=True).mean(), args.repeat), 's')
+    results['analysis.timedelta_index'] = (measure(lambda: df.set_index(pd.to_timedelta(df['TIME'], unit='s')), args.repeat), 's')
+
+    def deflection():
+        # the calibrated temperature and output deflection, as plotted by record_max_torque
+        temperature = calibrated_motor_temperature(df['MOTOR_TEMPERATURE'])
+        return (temperature, (df['POSITION'] - df['POSITION'].mean()) * 360)
+
+    results['analysis.deflection'] = (measure(deflection, args.repeat), 's')
+    return results
+
+
+BENCHMARKS = {
+    'profile': bench_profile,
+    'telemetry': bench_telemetry,
+    'dataframe': bench_dataframe,
+    'analysis': bench_analysis,
+}
+
+
+def read_history():
+    if not os.path.exists(HISTORY_FILE):
+        return []
+    with open(HISTORY_FILE) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(results, history):
+    # list of (name, value, baseline, message) for every regression
+    regressions = []
+    for name, (value, unit) in results.items():
+        previous = [run['results'][name]['value'] for run in history if name in run['results']][-HISTORY_WINDOW:]
+        if not previous:
+            continue
+        if unit == 'count':
+            if value != previous[-1]:
+                regressions.append((name, value, previous[-1], 'changed'))
+        else:
+            baseline = float(np.median(previous))
+            if value > baseline * (1 + TOLERANCE):
+                regressions.append((name, value, baseline, f'{value/baseline - 1:+.0%}'))
+    return regressions
+
+
+def format_value(value, unit):
+    if unit == 'count':
+        return f'{value}'
+    for scale, prefix in ((1, 's'), (1e-3, 'ms'), (1e-6, 'us')):
+        if value >= scale:
+            return f'{value/scale:.3g} {prefix}'
+    return f'{value*1e9:.3g} ns'
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Hardware free benchmarks of the hot paths')
+    parser.add_argument('groups', nargs='*', help=f'benchmark groups to run, default all of {list(BENCHMARKS)}')
+    parser.add_argument('--samples', type=int, default=1_000_000, help='samples in the recorded test data')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions of the large benchmarks, the best one counts')
+    parser.add_argument('--no-save', action='store_true', help='do not append this run to the history')
+    parser.add_argument('--accept', action='store_true', help='save this run even with regressions, as the new baseline')
+    args = parser.parse_args()
+
+    unknown = [group for group in args.groups if group not in BENCHMARKS]
+    if unknown:
+        print(f'Unknown benchmark groups {unknown}, choose from {list(BENCHMARKS)}')
+        sys.exit(1)
+
+    # only runs on the same amount of data are comparable
+    history = [run for run in read_history() if run['samples'] == args.samples]
+    results = {}
+    for group in args.groups or BENCHMARKS:
+        start = time.perf_counter()
+        group_results = BENCHMARKS[group](args)
+        print(f'{group} ({time.perf_counter() - start:.1f}s)')
+        for name, (value, unit) in group_results.items():
+            print(f'    {name:40s} {format_value(value, unit):>12s}')
+        results.update(group_results)
+
+    regressions = compare(results, history)
+    for name, value, baseline, message in regressions:
+        unit = results[name][1]
+        print(f'REGRESSION {name}: {format_value(value, unit)}, baseline {format_value(baseline, unit)} ({message})')
+
+    if not args.no_save and (not regressions or args.accept):
+        run = {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'samples': args.samples,
+            'results': {name: {'value': value, 'unit': unit} for name, (value, unit) in results.items()},
+        }
+        with open(HISTORY_FILE, 'a') as f:
+            f.write(json.dumps(run) + '\n')
+        print(f'Saved to {HISTORY_FILE}')
+
+    if regressions and not args.accept:
+        print(f'{len(regressions)} regressions, run not saved')
+        sys.exit(1)
@@ -0,0 +1,188 @@
+'''
+Headless build of the figures in ./figures from the data in ./test_data.
+
+Every figure declares its input files, plot function and parameters in FIGURES. A
+figure is only rendered again when the content of an input file, its parameters, the
+source of its plot function or of the helpers and constants shared by all plot functions
+(SHARED) changed since the last build, tracked by content hashes in
+figures/.build_cache.json. Figures that need rendering are built in parallel processes.
+
+    python build_figures.py                 # build what changed
+    python build_figures.py --force         # build everything
+    python build_figures.py trajectory_700gr_32v --jobs 2
+'''
+
+import os
+import sys
+import json
+import time
+import hashlib
+import inspect
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import downsample
+from downsample import plot_downsampled
+
+
+CACHE_FILE = 'figures/.build_cache.json'
+rev_to_rad = 2 * 3.141592653589793
+
+
+def setup_style():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    # same style as the analysis notebooks, latex text in the exported svg
+    plt.rcParams['svg.fonttype'] = 'none'
+    plt.rc('legend', fontsize=8.3)
+    plt.rc('grid', color='0.9')
+    plt.rcParams['axes.grid'] = True
+    return plt
+
+
+def plot_trajectory(filenames, output, figsize, xlim, ylims=None, legend_locs=None):
+    plt = setup_style()
+    import pandas as pd
+
+    df = pd.read_csv(filenames[0])
+    fig, axs = plt.subplots(3, 1, figsize=figsize, sharex=True)
+
+    plot_downsampled(axs[0], df['TIME'], df['COMMAND_POSITION']*rev_to_rad, label='\\ld{Command Position}')
+    plot_downsampled(axs[0], df['TIME'], df['CONTROL_POSITION']*rev_to_rad, label='\\ld{Control Position}')
+    plot_downsampled(axs[0], df['TIME'], df['POSITION']*rev_to_rad, label='\\ld{Position}')
+    axs[0].set_ylabel('Position [rad]')
+
+    plot_downsampled(axs[1], df['TIME'], df['CONTROL_VELOCITY']*rev_to_rad, label='\\ld{Control Velocity}')
+    plot_downsampled(axs[1], df['TIME'], df['VELOCITY']*rev_to_rad, label='\\ld{Velocity}')
+    axs[1].set_ylabel('Velocity [rad/s]')
+
+    plot_downsampled(axs[2], df['TIME'], df['CONTROL_TORQUE'], label='\\ld{Control Torque}')
+    plot_downsampled(axs[2], df['TIME'], df['TORQUE'], label='\\ld{Torque}')
+    axs[2].set_ylabel('Torque [Nm]')
+
+    for ax, loc in zip(axs, legend_locs or ['upper left']*3):
+        ax.legend(loc=loc)
+    for ax, ylim in zip(axs, ylims or [None]*3):
+        if ylim is not None:
+            ax.set_ylim(ylim)
+    axs[2].set_xlim(xlim)
+    axs[2].set_xlabel('Time [s]')
+
+    fig.tight_layout()
+    fig.savefig(output)
+    plt.close(fig)
+
+
+# output file: plot function, input files and parameters
+FIGURES = {
+    'figures/trajectory_700gr_32v.svg': {
+        'plot': plot_trajectory,
+        'inputs': ['test_data/2024-08-07__15-35-35_trajectory_700gr 32v.csv'],
+        'params': {'figsize': [7.2, 7.5], 'xlim': [10, 35]},
+    },
+    'figures/trajectory_700gr_32v_closeup_slow.svg': {
+        'plot': plot_trajectory,
+        'inputs': ['test_data/2024-08-07__15-35-35_trajectory_700gr 32v.csv'],
+        'params': {'figsize': [3.4, 6.0], 'xlim': [11, 13.4], 'ylims': [None, [-2.5, 5.2], [-11, 15.0]],
+                   'legend_locs': ['upper left', 'lower left', 'lower left']},
+    },
+    'figures/trajectory_700gr_32v_closeup_quick.svg': {
+        'plot': plot_trajectory,
+        'inputs': ['test_data/2024-08-07__15-35-35_trajectory_700gr 32v.csv'],
+        'params': {'figsize': [3.4, 6.0], 'xlim': [30.6, 31.65], 'ylims': [None, [-7.0, 11.0], [-110, 110.0]],
+                   'legend_locs': ['upper left', 'lower left', 'lower left']},
+    },
+}
+
+
+def file_hash(filename):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# helpers and constants used by the plot functions, part of every figure key
+SHARED = (setup_style, downsample)
+SHARED_CONSTANTS = {'rev_to_rad': rev_to_rad}
+
+
+def figure_key(figure, hashes):
+    # everything that changes the rendered figure
+    h = hashlib.sha256()
+    h.update(inspect.getsource(figure['plot']).encode('utf8'))
+    for shared in SHARED:
+        h.update(inspect.getsource(shared).encode('utf8'))
+    h.update(json.dumps(SHARED_CONSTANTS, sort_keys=True).encode('utf8'))
+    h.update(json.dumps(figure['params'], sort_keys=True).encode('utf8'))
+    for filename in figure['inputs']:
+        h.update(hashes[filename].encode('utf8'))
+    return h.hexdigest()
+
+
+def render(output, plot_name, inputs, params):
+    start = time.perf_counter()
+    globals()[plot_name](inputs, output, **params)
+    return time.perf_counter() - start
+
+
+def build(outputs, force=False, jobs=None):
+    cache = {}
+    if os.path.exists(CACHE_FILE):
+        with open(CACHE_FILE) as f:
+            cache = json.load(f)
+
+    # hash each input file once, even when it is used by several figures
+    hashes = {}
+    todo = {}
+    for output in outputs:
+        figure = FIGURES[output]
+        missing = [filename for filename in figure['inputs'] if not os.path.exists(filename)]
+        if missing:
+            print(f'skipped {output}, missing {missing}')
+            continue
+        for filename in figure['inputs']:
+            if filename not in hashes:
+                hashes[filename] = file_hash(filename)
+        key = figure_key(figure, hashes)
+        if force or cache.get(output) != key or not os.path.exists(output):
+            todo[output] = key
+        else:
+            print(f'up to date {output}')
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(render, output, FIGURES[output]['plot'].__name__,
+                                   FIGURES[output]['inputs'], FIGURES[output]['params']): output
+                   for output in todo}
+        for future in as_completed(futures):
+            output = futures[future]
+            try:
+                duration = future.result()
+            except Exception as e:
+                print(f'failed {output}: {e}')
+                continue
+            cache[output] = todo[output]
+            print(f'built {output} in {duration:.1f}s')
+
+    with open(CACHE_FILE, 'w') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the figures from the test data')
+    parser.add_argument('names', nargs='*', help='figures to build, by (part of) the output name. Default all')
+    parser.add_argument('--force', action='store_true', help='build even when the inputs did not change')
+    parser.add_argument('--jobs', type=int, default=None, help='number of worker processes, default one per cpu')
+    args = parser.parse_args()
+
+    outputs = [output for output in FIGURES if not args.names or any(name in output for name in args.names)]
+    if not outputs:
+        print(f'No figures match {args.names}')
+        sys.exit(1)
+
+    start = time.perf_counter()
+    build(outputs, args.force, args.jobs)
+    print(f'Done in {time.perf_counter() - start:.1f}s')
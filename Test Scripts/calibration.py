@@ -0,0 +1,14 @@
+'''
+Calibration of the raw moteus registers, shared by the test scripts, the live monitor
+and the analysis. Only plain arithmetic, so it works on floats, numpy arrays and pandas
+columns alike and importing it does not pull in moteus or numpy.
+'''
+
+
+# MOTOR_TEMPERATURE register of the motor thermistor to degrees Celsius
+MOTOR_TEMPERATURE_SCALE = 0.442
+MOTOR_TEMPERATURE_OFFSET = -1.62
+
+
+def calibrated_motor_temperature(value):
+    return value * MOTOR_TEMPERATURE_SCALE + MOTOR_TEMPERATURE_OFFSET
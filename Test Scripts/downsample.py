@@ -0,0 +1,114 @@
+'''
+Downsampling of dense logs for plotting.
+
+A line through a million samples is drawn into a few thousand pixel columns, so only the
+extremes within each column are visible. MinMaxPyramid stores the index of the minimum and
+maximum of every bucket of 2, 4, 8, ... samples, built once per signal in O(n). A query
+for a time range and a pixel width then returns only the samples that are visible, which
+keeps interactive zooming through hour long run-ins fast and saved SVGs small.
+
+    line = plot_downsampled(ax, df['TIME'], df['TORQUE'], label='Torque')
+
+plots like ax.plot and queries the pyramid again whenever the x limits change.
+lttb() gives a smoother looking subset with a fixed number of points, minmax_indices() a
+single level min/max decimation for data that changes every frame.
+'''
+
+import numpy as np
+
+
+def minmax_indices(y, num_buckets):
+    # indices of the first, last and the min and max of each of num_buckets equal buckets
+    y = np.asarray(y)
+    n = len(y)
+    if n <= 2 * num_buckets:
+        return np.arange(n)
+    s = -(-n // num_buckets)
+    padded = np.concatenate((y, np.repeat(y[-1:], num_buckets*s - n))).reshape(num_buckets, s)
+    offset = np.arange(num_buckets) * s
+    indices = np.concatenate(([0, n-1], offset + padded.argmin(axis=1), offset + padded.argmax(axis=1)))
+    return np.unique(np.minimum(indices, n-1))
+
+
+def lttb(x, y, num_points):
+    # largest triangle three buckets: per bucket the point that spans the largest triangle
+    # with the selected point of the previous bucket and the average of the next one
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if num_points >= n or num_points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n-1, num_points-1).astype(int)
+    indices = np.empty(num_points, dtype=int)
+    indices[0] = 0
+    indices[-1] = n-1
+    for i in range(num_points-2):
+        start, end = edges[i], edges[i+1]
+        next_end = edges[i+2] if i+2 < len(edges) else n
+        mean_x = x[end:next_end].mean()
+        mean_y = y[end:next_end].mean()
+        a = indices[i]
+        area = np.abs((x[a] - mean_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (mean_y - y[a]))
+        indices[i+1] = start + np.argmax(area)
+    return indices
+
+
+class MinMaxPyramid:
+    def __init__(self, x, y, min_buckets=64):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+
+        # level k holds the min and max index of every bucket of 2**(k+1) samples
+        self.levels = []
+        mins = maxs = np.arange(len(self.y))
+        while len(mins) > 2 * min_buckets:
+            if len(mins) % 2:
+                mins = np.append(mins, mins[-1])
+                maxs = np.append(maxs, maxs[-1])
+            mins = mins.reshape(-1, 2)
+            maxs = maxs.reshape(-1, 2)
+            mins = np.where(self.y[mins[:, 0]] <= self.y[mins[:, 1]], mins[:, 0], mins[:, 1])
+            maxs = np.where(self.y[maxs[:, 0]] >= self.y[maxs[:, 1]], maxs[:, 0], maxs[:, 1])
+            self.levels.append((mins, maxs))
+
+    def query(self, x_min=None, x_max=None, pixels=1000):
+        # sorted indices of the visible samples between x_min and x_max, about 2 per pixel,
+        # including one sample outside each side so the line continues to the border
+        n = len(self.x)
+        i0 = 0 if x_min is None else max(int(np.searchsorted(self.x, x_min)) - 1, 0)
+        i1 = n if x_max is None else min(int(np.searchsorted(self.x, x_max, side='right')) + 1, n)
+        count = i1 - i0
+        level = int(np.log2(max(count / max(pixels, 1), 1))) - 1
+        level = min(level, len(self.levels) - 1)
+        if level < 0 or count <= 4 * pixels:
+            return np.arange(i0, i1)
+
+        # whole buckets from the pyramid, the partial ones at the edges as they are
+        s = 2 ** (level + 1)
+        b0 = -(-i0 // s)
+        b1 = i1 // s
+        mins, maxs = self.levels[level]
+        indices = np.concatenate((np.arange(i0, b0*s), mins[b0:b1], maxs[b0:b1], np.arange(b1*s, i1)))
+        return np.unique(indices)
+
+    def xy(self, x_min=None, x_max=None, pixels=1000):
+        indices = self.query(x_min, x_max, pixels)
+        return (self.x[indices], self.y[indices])
+
+
+def plot_downsampled(ax, x, y, *args, oversample=2, **kwargs):
+    # ax.plot for long signals, only the samples visible at the width of the axes are drawn
+    pyramid = MinMaxPyramid(x, y)
+
+    def pixels():
+        return int(ax.bbox.width * oversample)
+
+    line, = ax.plot(*pyramid.xy(pixels=pixels()), *args, **kwargs)
+
+    def update(ax):
+        (x_min, x_max) = ax.get_xlim()
+        line.set_data(*pyramid.xy(x_min, x_max, pixels()))
+
+    ax.callbacks.connect('xlim_changed', update)
+    return line
@@ -0,0 +1,151 @@
+'''
+Frequency response identification from a chirp or multisine excitation.
+
+The excitation signals are generated here and played out by record_frequency_response.py.
+The transfer function from the excitation to the response is estimated from the cross and
+auto spectra, which also give the coherence to judge which frequencies are trustworthy:
+- a multisine is repeated a number of whole periods. periodic_transfer_function averages
+  the spectra of the periods, without windows or leakage, at the frequencies of its tones.
+- a chirp is a single sweep. welch_transfer_function averages Hann windowed, half
+  overlapping segments, which have to span several periods of the lowest frequency to
+  resolve it. Every segment only covers part of the sweep, so the coherence of a chirp is
+  an indication at best.
+'''
+
+import math
+
+import numpy as np
+
+
+def log_chirp(t, f0, f1, duration, derivative=False):
+    # logarithmic sweep from f0 to f1 [Hz] in duration [s], unit amplitude.
+    # derivative gives its time derivative [1/s] instead, for the velocity feedforward
+    k = f1 / f0
+    growth = k ** (np.asarray(t) / duration)
+    phase = 2*math.pi * f0 * duration / math.log(k) * (growth - 1)
+    if derivative:
+        return 2*math.pi * f0 * growth * np.cos(phase)
+    return np.sin(phase)
+
+
+def multisine(t, f0, f1, duration, num_tones=30, seed=0, derivative=False):
+    # log spaced tones on the frequency grid of duration, Schroeder phases for a low crest factor
+    # scaled to unit peak over t, so t has to cover the whole excitation.
+    # derivative gives the time derivative [1/s] of the same scaled signal instead
+    freqs = np.unique(np.round(np.geomspace(f0, f1, num_tones) * duration) / duration)
+    phases = -math.pi * np.arange(len(freqs)) * (np.arange(len(freqs)) + 1) / len(freqs)
+    t = np.asarray(t)[..., np.newaxis]
+    signal = np.sin(2*math.pi * freqs * t + phases).sum(axis=-1)
+    if derivative:
+        rate = (2*math.pi * freqs * np.cos(2*math.pi * freqs * t + phases)).sum(axis=-1)
+        return rate / np.abs(signal).max()
+    return signal / np.abs(signal).max()
+
+
+def resample_uniform(t, *signals):
+    # the control loop does not sample at a fixed rate, interpolate at the median interval
+    t = np.asarray(t, dtype=float)
+    dt = np.median(np.diff(t))
+    t_uniform = np.arange(t[0], t[-1], dt)
+    return (t_uniform, dt) + tuple(np.interp(t_uniform, t, s) for s in signals)
+
+
+def welch_transfer_function(t, u, y, segment_time=None, f_min=None, min_periods=4):
+    # H = Puy / Puu, averaged over half overlapping Hann windowed segments
+    # returns frequencies [Hz], complex H and the coherence
+    # by default the segments span min_periods of f_min [Hz], or an eighth of the record
+    (t, dt, u, y) = resample_uniform(t, u, y)
+    if segment_time is None:
+        segment_time = (t[-1] - t[0]) / 8 if f_min is None else min_periods / f_min
+    n = min(len(t), int(segment_time / dt))
+    step = n // 2
+    starts = np.arange(0, len(t) - n + 1, step)
+
+    window = np.hanning(n)
+    index = starts[:, np.newaxis] + np.arange(n)
+    U = np.fft.rfft((u[index] - u[index].mean(axis=1, keepdims=True)) * window, axis=1)
+    Y = np.fft.rfft((y[index] - y[index].mean(axis=1, keepdims=True)) * window, axis=1)
+
+    Puu = np.mean(np.abs(U)**2, axis=0)
+    Pyy = np.mean(np.abs(Y)**2, axis=0)
+    Puy = np.mean(np.conj(U) * Y, axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        H = Puy / Puu
+        coherence = np.abs(Puy)**2 / (Puu * Pyy)
+
+    freqs = np.fft.rfftfreq(n, dt)
+    return (freqs, H, coherence)
+
+
+def periodic_transfer_function(t, u, y, period, skip=1, min_power=0.01):
+    # H = Puy / Puu of a periodic excitation, averaged over its whole periods. The first
+    # skip periods hold the transient and are left out. Returns only the excited
+    # frequencies [Hz], those with at least min_power of the strongest, with H and coherence
+    t = np.asarray(t, dtype=float)
+    samples = round(period / np.median(np.diff(t)))
+    dt = period / samples
+    t_uniform = np.arange(t[0], t[-1], dt)
+    u = np.interp(t_uniform, t, u)
+    y = np.interp(t_uniform, t, y)
+
+    periods = len(t_uniform) // samples
+    if periods <= skip:
+        raise ValueError(f'{periods} whole periods recorded, more than skip={skip} needed')
+    U = np.fft.rfft(u[skip*samples:periods*samples].reshape(-1, samples), axis=1)
+    Y = np.fft.rfft(y[skip*samples:periods*samples].reshape(-1, samples), axis=1)
+
+    Puu = np.mean(np.abs(U)**2, axis=0)
+    Pyy = np.mean(np.abs(Y)**2, axis=0)
+    Puy = np.mean(np.conj(U) * Y, axis=0)
+    excited = Puu >= min_power * Puu[1:].max()
+    excited[0] = False
+
+    H = Puy[excited] / Puu[excited]
+    coherence = np.abs(Puy[excited])**2 / (Puu[excited] * Pyy[excited])
+    freqs = np.fft.rfftfreq(samples, dt)[excited]
+    return (freqs, H, coherence)
+
+
+def response_metrics(freqs, H, coherence, f_min, f_max, min_coherence=0.8):
+    # bandwidth (-3dB), resonance and phase margin of a closed loop response H, using only
+    # the excited and coherent frequencies. The phase margin assumes unity feedback,
+    # with the open loop L = H / (1 - H).
+    valid = (freqs >= f_min) & (freqs <= f_max) & (coherence >= min_coherence)
+    freqs = freqs[valid]
+    H = H[valid]
+    metrics = {'bandwidth': math.nan, 'resonance_freq': math.nan, 'resonance_peak': math.nan,
+               'crossover_freq': math.nan, 'phase_margin': math.nan}
+    if len(freqs) < 3:
+        return metrics
+
+    gain_db = 20 * np.log10(np.abs(H))
+    dc_gain_db = gain_db[:3].mean()
+
+    below = np.nonzero(gain_db < dc_gain_db - 3)[0]
+    if len(below):
+        metrics['bandwidth'] = freqs[below[0]]
+
+    peak = np.argmax(gain_db)
+    metrics['resonance_freq'] = freqs[peak]
+    metrics['resonance_peak'] = gain_db[peak] - dc_gain_db
+
+    L = H / (1 - H)
+    magnitude = np.abs(L)
+    crossing = np.nonzero((magnitude[:-1] >= 1) & (magnitude[1:] < 1))[0]
+    if len(crossing):
+        # interpolate between the two bins around the crossover
+        i = crossing[0]
+        fraction = math.log(magnitude[i]) / math.log(magnitude[i] / magnitude[i+1])
+        phase = np.unwrap(np.angle(L[i:i+2]))
+        metrics['crossover_freq'] = freqs[i] + fraction * (freqs[i+1] - freqs[i])
+        metrics['phase_margin'] = 180 + np.degrees(phase[0] + fraction * (phase[1] - phase[0]))
+
+    return metrics
+
+
+def print_metrics(metrics):
+    print('Frequency response:')
+    print(f'    bandwidth (-3dB): {metrics["bandwidth"]:.2f} Hz')
+    print(f'    resonance: {metrics["resonance_peak"]:.1f} dB at {metrics["resonance_freq"]:.2f} Hz')
+    print(f'    phase margin: {metrics["phase_margin"]:.1f} deg at {metrics["crossover_freq"]:.2f} Hz')
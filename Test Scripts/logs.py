@@ -0,0 +1,22 @@
+'''
+Reading the recorded test CSVs from test_data/, shared by the replay, the thermal fit and
+the analysis. Does not import moteus, so it also works without the rig libraries.
+'''
+
+import pandas as pd
+
+
+def read_log(filename):
+    # the run-in test writes ';' separated files, the other tests use pandas defaults
+    with open(filename) as f:
+        header = f.readline()
+    df = pd.read_csv(filename, sep=';' if ';' in header else ',')
+
+    # recorded timestamps are either seconds since the start or raw nanoseconds. Raw
+    # nanoseconds do not fit a float exactly, so the start is subtracted as integers
+    t = df['TIME'].to_numpy()
+    t = t - t[0]
+    if t[-1] > 1e7:
+        t = t / 1e9
+    df['TIME'] = t.astype(float)
+    return df
@@ -1,87 +1,123 @@
 import math
-import time, datetime
+import datetime
 
 from threading import Thread
 import asyncio
 from actuator import Actuator
+from calibration import calibrated_motor_temperature
 
 
 
+STORED_DATA = ['POSITION', 'VELOCITY', 'TORQUE', 'Q_CURRENT', 'TEMPERATURE', 'MOTOR_TEMPERATURE']	
+
 continue_flag = True
-async def run_at_speed(actuator, speed, filename):
-    print_time = time.time()
+
+# check(state) is called every print interval with the last state, the run stops when it
+# returns False. Returns False when stopped by the check
+async def run_at_speed(actuator, speed, filename, duration=None, check=None):
+    clock = actuator.clock
+    succes = True
+    print_time = clock.time()
     print_interval = 10
-    torques = []
+    torque_sum = 0.0
+    torque_count = 0
     last_torq_avg = 1.0
-    test_start_time = time.time()
+    test_start_time = clock.time()
 
     direction_change_interfal = 120
-    direction_change_time = time.time()
+    direction_change_time = clock.time()
     direction = 1
 
     print(f'Starting run-in test at {speed} rps, time: {test_start_time}, saving to {filename}')
 
     with open(filename, 'w') as f:
         result = await actuator.set_position(math.nan, speed, accel_limit=50)
-        state = actuator.state_to_dict(result, time.time_ns())
+        state = actuator.state_to_dict(result, clock.time_ns())
         state['DIRECTION'] = direction
         f.write(';'.join(state.keys()) + '\n')
 
+        # rows are written 100 at a time instead of every cycle, the rest when the loop ends
+        # or fails. The registers are F32, 9 digits keep them exact and format a lot
+        # quicker than the full repr of the double
+        row_format = ';'.join('%d' if key in ('TIME', 'DIRECTION') else '%.9g' for key in state) + '\n'
+        rows = []
+        try:
+            while True:
+                rows.append(tuple(state.values()))
+                torque_sum += state['TORQUE'] * direction
+                torque_count += 1
+
+                if clock.time() - print_time > print_interval:
+                    torq_avg = torque_sum / torque_count
+                    if last_torq_avg == 0:
+                        torq_change = 0
+                    else:
+                        torq_change = (torq_avg-last_torq_avg)/last_torq_avg * 100
+                    torque_sum = 0.0
+                    torque_count = 0
+                    last_torq_avg = torq_avg
+                    time_elapsed = clock.time() - test_start_time
+                    print(f'Time: {time_elapsed:.1f}s,\t torque_avg: {torq_avg:7.3f},\t torq_change:{torq_change:7.3f}%,\t temp_moteus: {state["TEMPERATURE"]}C, \t temp_motor:~{calibrated_motor_temperature(state["MOTOR_TEMPERATURE"]):.2f}C')
+                    print_time = clock.time()
+
+                    if check is not None and not check(state):
+                        succes = False
+                        break
+
+                if len(rows) >= 100:
+                    f.write(''.join(map(row_format.__mod__, rows)))
+                    rows = []
+
+                if not continue_flag or (duration is not None and clock.time() - test_start_time >= duration):
+                    break
+                if clock.time() - direction_change_time > direction_change_interfal:
+                    direction_change_time = clock.time()
+                    direction *= -1
+                    print(f'Changing direction to {direction}')
+                result = await actuator.set_position(math.nan, speed*direction, accel_limit=2)
+                state = actuator.state_to_dict(result, clock.time_ns())
+                state['DIRECTION'] = direction
+        finally:
+            f.write(''.join(map(row_format.__mod__, rows)))
 
-        while continue_flag:
-            if time.time() - direction_change_time > direction_change_interfal:
-                direction_change_time = time.time()
-                direction *= -1
-                print(f'Changing direction to {direction}')
-            result = await actuator.set_position(math.nan, speed*direction, accel_limit=2)
-            state = actuator.state_to_dict(result, time.time_ns())
-            state['DIRECTION'] = direction
-            f.write(';'.join(map(str, state.values())) + '\n')
-            torques.append(state['TORQUE'] * direction)
-
-            if time.time() - print_time > print_interval:
-                torq_avg = sum(torques) / len(torques)
-                if last_torq_avg == 0:
-                    torq_change = 0
-                else:
-                    torq_change = (torq_avg-last_torq_avg)/last_torq_avg * 100
-                torques = []
-                last_torq_avg = torq_avg
-                time_elapsed = time.time() - test_start_time
-                print(f'Time: {time_elapsed:.1f}s,\t torque_avg: {torq_avg:7.3f},\t torq_change:{torq_change:7.3f}%,\t temp_moteus: {state["TEMPERATURE"]}C, \t temp_motor:~{state["MOTOR_TEMPERATURE"] *0.442 - 1.62:.2f}C')
-                print_time = time.time()
-
-    
     await actuator.slow_down()
     await actuator.stop_and_zero()
+    return succes
 
 
-def start_run_in(actuator, speed, filename):
-    asyncio.run(run_at_speed(actuator, speed, filename))
-
-
-if __name__ == '__main__':
-    TOP_SPEED = 0.35
-    
-    STORED_DATA = ['POSITION', 'VELOCITY', 'TORQUE', 'Q_CURRENT', 'TEMPERATURE', 'MOTOR_TEMPERATURE']	
-
-    test_name = input('Enter test name: ')
-    actuator = Actuator(1, STORED_DATA)
-    
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d__%H-%M-%S')
-    filename = f'test_data/{timestamp}_run-in_{test_name}_{TOP_SPEED}rps.csv'
+def start_run_in(actuator, speed, filename, duration=None):
+    asyncio.run(run_at_speed(actuator, speed, filename, duration))
 
-    # start thread to collect data
-    run_in_thread = Thread(target=start_run_in, args=(actuator, TOP_SPEED, filename), daemon=True)  
-    run_in_thread.start()
 
+def stop_detector():
+    global continue_flag
     while True:
         key = input('send q to stop:\n')
         if key == 'q':
             continue_flag = False
             break
 
-    run_in_thread.join()
+
+def run_in_test(test_name, speed, duration=None, actuator_id=1):
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d__%H-%M-%S')
+    filename = f'test_data/{timestamp}_run-in_{test_name}_{speed}rps.csv'
+
+    with Actuator(actuator_id, STORED_DATA) as actuator:
+        actuator.start_monitor(window=300, size=2**19)
+
+        # start thread to collect data
+        run_in_thread = Thread(target=start_run_in, args=(actuator, speed, filename, duration), daemon=True)  
+        run_in_thread.start()
+
+        # stop on q, or when the duration is over
+        Thread(target=stop_detector, daemon=True).start()
+        run_in_thread.join()
 
     print('Run-in test done, saved to', filename)
 
+
+if __name__ == '__main__':
+    TOP_SPEED = 0.35
+
+    test_name = input('Enter test name: ')
+    run_in_test(test_name, TOP_SPEED)
@@ -0,0 +1,124 @@
+'''
+Apply a logarithmic chirp or multisine around the current position and estimate the
+frequency response. Used to estimate bandwidth, resonance and phase margin in seconds
+instead of a full trajectory campaign.
+'''
+
+import time, datetime
+
+import asyncio
+from actuator import Actuator
+
+
+STORED_DATA = ['POSITION', 'CONTROL_POSITION', 'VELOCITY', 'TORQUE', 'Q_CURRENT', 'FAULT']
+
+
+async def do_excitation(actuator, signal, mode, amplitude, duration, center, derivative=None):
+    # position mode: excitation in output revolutions around center, with derivative(t) of
+    # the signal as velocity feedforward so the velocity loop does not resist the motion
+    # torque mode: feedforward torque in Nm with the position loop switched off
+    import pandas as pd
+
+    states = []
+    start_time = time.monotonic_ns()
+
+    while True:
+        t = (time.monotonic_ns() - start_time) / 1e9
+        if t > duration:
+            break
+        excitation = amplitude * signal(t)
+        if mode == 'position':
+            velocity = 0.0 if derivative is None else amplitude * derivative(t)
+            result = await actuator.set_position(position=center + excitation, velocity=velocity)
+        else:
+            result = await actuator.set_position(feedforward_torque=excitation, kp_scale=0.0, kd_scale=0.0)
+        state = actuator.state_to_dict(result, time.monotonic_ns())
+        state['EXCITATION'] = center + excitation if mode == 'position' else excitation
+        states.append(state)
+
+        if state['FAULT'] != 0:
+            print(f'Fault detected: {state["FAULT"]}')
+            break
+
+        await asyncio.sleep(0.0002)
+
+    await actuator.slow_down()
+    await actuator.m.set_stop()
+
+    df = pd.DataFrame(states)
+    df['TIME'] = (df['TIME'] - start_time) / 1e9
+    return df
+
+
+# the multisine is repeated periods times within duration, the first period is not used
+def frequency_response_test(test_name, mode='position', signal_name='chirp', amplitude=0.005,
+                            f_min=0.5, f_max=50.0, duration=20.0, periods=5, actuator_id=1):
+    import numpy as np
+    from frequency_response import (log_chirp, multisine, welch_transfer_function, periodic_transfer_function,
+                                    response_metrics, print_metrics)
+
+    actuator = Actuator(actuator_id, STORED_DATA)
+    center = actuator.state_to_dict(asyncio.run(actuator.m.query()))['POSITION']
+
+    if signal_name == 'chirp':
+        signal = lambda t: log_chirp(t, f_min, f_max, duration)
+        derivative = lambda t: log_chirp(t, f_min, f_max, duration, derivative=True)
+    else:
+        # one period precomputed, its tones are on the frequency grid of the period
+        period = duration / periods
+        grid = np.arange(0, period, 0.1/f_max)
+        values = multisine(grid, f_min, f_max, period)
+        rates = multisine(grid, f_min, f_max, period, derivative=True)
+        signal = lambda t: np.interp(t, grid, values, period=period)
+        derivative = lambda t: np.interp(t, grid, rates, period=period)
+
+    df = asyncio.run(do_excitation(actuator, signal, mode, amplitude, duration, center, derivative))
+    print(f'Done, datarate was {len(df)/df["TIME"].iloc[-1]:.2f} Hz')
+
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d__%H-%M-%S')
+    filename = f'test_data/{timestamp}_frequency-response_{mode}_{signal_name}_{test_name}.csv'
+    print(f'Saving data to {filename}')
+    df.to_csv(filename, index=False)
+
+    # transfer function from excitation to position
+    if signal_name == 'chirp':
+        freqs, H, coherence = welch_transfer_function(df['TIME'], df['EXCITATION'], df['POSITION'], f_min=f_min)
+    else:
+        freqs, H, coherence = periodic_transfer_function(df['TIME'], df['EXCITATION'], df['POSITION'], period)
+    metrics = response_metrics(freqs, H, coherence, f_min, f_max)
+    if mode == 'position':
+        print_metrics(metrics)
+    else:
+        print(f'Resonance: {metrics["resonance_peak"]:.1f} dB at {metrics["resonance_freq"]:.2f} Hz')
+
+    import matplotlib.pyplot as plt
+    excited = (freqs >= f_min) & (freqs <= f_max)
+    fig, ax = plt.subplots(3, 1, figsize=(10, 10), sharex=True)
+    ax[0].semilogx(freqs[excited], 20*np.log10(np.abs(H[excited])))
+    ax[0].set_ylabel('gain [dB]')
+    ax[1].semilogx(freqs[excited], np.degrees(np.unwrap(np.angle(H[excited]))))
+    ax[1].set_ylabel('phase [deg]')
+    ax[2].semilogx(freqs[excited], coherence[excited])
+    ax[2].set_ylabel('coherence')
+    ax[2].set_xlabel('frequency [Hz]')
+    plt.show()
+    return df
+
+
+if __name__ == '__main__':
+    MODE = 'position'       # 'position' or 'torque'
+    SIGNAL = 'chirp'        # 'chirp' or 'multisine'
+    AMPLITUDE = 0.005       # rev at output in position mode, Nm in torque mode
+    F_MIN = 0.5             # Hz
+    F_MAX = 50.0            # Hz
+    TEST_DURATION = 20.0    # s
+    PERIODS = 5             # repetitions of the multisine, the first one is not used
+
+    print(f'\nRunning {SIGNAL} in {MODE} from {F_MIN} to {F_MAX} Hz in {TEST_DURATION} seconds, amplitude {AMPLITUDE}')
+    test_name = input('Enter test name: ')
+
+    if test_name == '':
+        print('No test name given, exiting')
+        exit()
+
+    frequency_response_test(test_name, MODE, SIGNAL, AMPLITUDE, F_MIN, F_MAX, TEST_DURATION, PERIODS)
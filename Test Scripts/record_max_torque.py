@@ -4,17 +4,23 @@ Do a slow torque ramp towards a small position change. Used to estimate internal
 
 import time, datetime
 import math
-
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
 import threading
 
 import asyncio
 from actuator import Actuator
+from calibration import calibrated_motor_temperature
+from thermal import ThermalModel
+
+
+# STORED_DATA = ['POSITION', 'TORQUE', 'CONTROL_TORQUE', 'Q_CURRENT', 'FAULT', 
+STORED_DATA = [ 'POSITION', 'TORQUE', 'CONTROL_TORQUE', 'Q_CURRENT',
+                'FAULT', 'TRAJECTORY_COMPLETE',
+                'TEMPERATURE', 'MOTOR_TEMPERATURE',
+]
 
 abs_start_time = time.monotonic_ns()
 e_stop = False
+thermal_model = None
 
 async def do_torque_ramp(actuator: Actuator, duration, max_torque):
     # ramp up till max torque in either direction 
@@ -25,15 +31,19 @@ async def do_torque_ramp(actuator: Actuator, duration, max_torque):
 
     try:
         print(f'Ramping to {max_torque} Nm in {ramp_duration} seconds.', end=' ', flush=True)
-        start_time = time.monotonic_ns()
+        start_time = actuator.clock.monotonic_ns()
         while not e_stop:
-            pct_done = (time.monotonic_ns() - start_time) / (ramp_duration*1e9)
+            pct_done = (actuator.clock.monotonic_ns() - start_time) / (ramp_duration*1e9)
             if pct_done > 1.0:
                 break
             torque = max_torque * pct_done
             result = await actuator.set_position(feedforward_torque=torque, kp_scale=0.0, kd_scale=0.0, velocity_limit=0.5)
-            states.append(actuator.state_to_dict(result, time.monotonic_ns()))
-            await asyncio.sleep(0.001)
+            states.append(actuator.state_to_dict(result, actuator.clock.monotonic_ns()))
+            if thermal_model is not None:
+                thermal_model.update(states[-1], states[-1]['TIME'] / 1e9)
+                if thermal_model.limit_predicted():
+                    raise Exception(f'Thermal limit predicted, {thermal_model.status()}')
+            await actuator.clock.sleep(0.001)
             
         if states[-1]['FAULT'] != 0:
             print(f'fault code: {states[-1]["FAULT"]}, STOPPING')
@@ -41,15 +51,17 @@ async def do_torque_ramp(actuator: Actuator, duration, max_torque):
 
         #ramp down torque
         print(f'\tand back down', end=' ', flush=True)
-        start_time = time.monotonic_ns()
+        start_time = actuator.clock.monotonic_ns()
         while not e_stop:
-            pct_done = (time.monotonic_ns() - start_time) / (ramp_duration*1e9)
+            pct_done = (actuator.clock.monotonic_ns() - start_time) / (ramp_duration*1e9)
             if pct_done > 1.0:
                 break
             torque = max_torque * (1-pct_done)
             result = await actuator.set_position(feedforward_torque=torque, kp_scale=0.0, kd_scale=0.0, velocity_limit=0.02)
-            states.append(actuator.state_to_dict(result, time.monotonic_ns()))
-            await asyncio.sleep(0.001)
+            states.append(actuator.state_to_dict(result, actuator.clock.monotonic_ns()))
+            if thermal_model is not None:
+                thermal_model.update(states[-1], states[-1]['TIME'] / 1e9)
+            await actuator.clock.sleep(0.001)
 
     except Exception as e:
         print(f'torqueramp failed. Error: {e}')
@@ -60,12 +72,15 @@ async def do_torque_ramp(actuator: Actuator, duration, max_torque):
             print(f'Emergency stop detected, stopping motor')
             succes = False
         print(f'\tDone. stopping motor')
+        if thermal_model is not None and thermal_model.temperature is not None:
+            print(f'\t{thermal_model.status()}')
         # await actuator.m.set_stop()
             
         return succes, states
     
 
-def torque_ramp_test(actuator: Actuator, test_duration, max_torque):
+def torque_ramp_test(actuator: Actuator, test_duration, max_torque, test_name):
+    import pandas as pd
     ramp_duration = test_duration/2
     pos_succes, pos_states = asyncio.run(do_torque_ramp(actuator, ramp_duration, max_torque))
     test_df = pd.DataFrame(pos_states)
@@ -82,6 +97,7 @@ def torque_ramp_test(actuator: Actuator, test_duration, max_torque):
         test_df.to_csv(filename, index=False)
 
         print(f'Ramp failed, still saved data to {filename}')
+        import matplotlib.pyplot as plt
         test_df.plot(x='TIME', y='TORQUE')
         plt.show()
         exit()
@@ -101,71 +117,55 @@ def e_stop_detector():
     
 
 
-if __name__ == '__main__':
-    STIFFNESS_TEST_TORQUE = 90.0          # Nm at output
-    STIFFNESS_TEST_DURATION = 8.0
-    STIFFNESS_TEST_REPETITIONS = 2
-
-    # STORED_DATA = ['POSITION', 'TORQUE', 'CONTROL_TORQUE', 'Q_CURRENT', 'FAULT', 
-    STORED_DATA = [ 'POSITION', 'TORQUE', 'CONTROL_TORQUE', 'Q_CURRENT',
-                    'FAULT', 'TRAJECTORY_COMPLETE',
-                    'TEMPERATURE', 'MOTOR_TEMPERATURE',
-    ]
-
-
-    print('\nStarting torque ramp test')
-    print(f'torque test: {STIFFNESS_TEST_TORQUE}Nm, {STIFFNESS_TEST_DURATION}s, {STIFFNESS_TEST_REPETITIONS} repetitions')
-    print('')
-    test_name = input('Enter test name: ')
-
-    if test_name == '':
-        print('No test name given, exiting')
-        exit()
-
+def max_torque_test(test_name, max_torque, duration, repetitions, temperature_limit=80.0,
+                    max_deviation=0.3, plot=True, actuator_id=1):
+    global thermal_model
 
-    # initialize actuator
-    actuator = Actuator(actuator_id=1, stored_data=STORED_DATA)
+    # initialize actuator, the monitor is also stopped when a ramp fails and the test exits
+    with Actuator(actuator_id=actuator_id, stored_data=STORED_DATA) as actuator:
+        actuator.start_monitor(window=20)
+        thermal_model = ThermalModel.load(limit=temperature_limit, horizon=3.0)
 
-    # set position to zero
-    asyncio.run(actuator.m.set_output_nearest(position=0.0))
+        # set position to zero
+        asyncio.run(actuator.m.set_output_nearest(position=0.0))
 
-    #for safety, configure motion limits
-    MAX_DEVIATION = 0.3    # measured in output revolutions    
-    result = asyncio.run(actuator.set_position())
-    asyncio.run(actuator.m.set_stop())
-    cur_pos = actuator.state_to_dict(result)['POSITION']
-    print(f'Current position: {cur_pos}, setting bounds to {cur_pos-MAX_DEVIATION} to {cur_pos+MAX_DEVIATION}')
-    asyncio.run(actuator.set_position_bounds(cur_pos-MAX_DEVIATION, cur_pos+MAX_DEVIATION))
+        #for safety, configure motion limits, measured in output revolutions
+        result = asyncio.run(actuator.set_position())
+        asyncio.run(actuator.m.set_stop())
+        cur_pos = actuator.state_to_dict(result)['POSITION']
+        print(f'Current position: {cur_pos}, setting bounds to {cur_pos-max_deviation} to {cur_pos+max_deviation}')
+        asyncio.run(actuator.set_position_bounds(cur_pos-max_deviation, cur_pos+max_deviation))
 
 
-    #start emergency stop
-    e_stop_thread = threading.Thread(target=e_stop_detector, daemon=True)
-    e_stop_thread.start()
+        #start emergency stop
+        e_stop_thread = threading.Thread(target=e_stop_detector, daemon=True)
+        e_stop_thread.start()
 
 
-    # move to a repeatable position:
-    succes, states = asyncio.run(do_torque_ramp(actuator, duration=2.0, max_torque=-3.0))
-    if not succes:
-        print('Failed to move to repeatable position, is output fixed?')
-        exit()
+        # move to a repeatable position:
+        succes, states = asyncio.run(do_torque_ramp(actuator, duration=2.0, max_torque=-3.0))
+        if not succes:
+            print('Failed to move to repeatable position, is output fixed?')
+            exit()
 
-    print('Starting tests\n')
-    abs_start_time = time.monotonic_ns()
-    all_states = []
+        print('Starting tests\n')
+        abs_start_time = actuator.clock.monotonic_ns()
+        all_states = []
 
-    for i in range(STIFFNESS_TEST_REPETITIONS):
-        test_df = torque_ramp_test(actuator, test_duration=STIFFNESS_TEST_DURATION, max_torque=STIFFNESS_TEST_TORQUE)
-        test_df['test_nr'] = i+100
-        all_states.append(test_df)
-        print(f'large ramp ramp {i} done')
+        for i in range(repetitions):
+            test_df = torque_ramp_test(actuator, test_duration=duration, max_torque=max_torque, test_name=test_name)
+            test_df['test_nr'] = i+100
+            all_states.append(test_df)
+            print(f'large ramp ramp {i} done')
         
 
-    # stop and restore old bounds config
-    asyncio.run(actuator.m.set_stop())
-    asyncio.run(actuator.set_position_bounds('nan', 'nan'))
+        # stop and restore old bounds config
+        asyncio.run(actuator.m.set_stop())
+        asyncio.run(actuator.set_position_bounds('nan', 'nan'))
 
 
     # store the data
+    import pandas as pd
     df = pd.concat(all_states)
     df['TIME'] = (df['TIME'] - abs_start_time) / 1e9
 
@@ -175,16 +175,38 @@ if __name__ == '__main__':
     df.to_csv(filename, index=False)
 
 
-    df['MOTOR_TEMPERATURE'] = df['MOTOR_TEMPERATURE'] * 0.442 - 1.62
+    if plot:
+        import matplotlib.pyplot as plt
+        df['MOTOR_TEMPERATURE'] = calibrated_motor_temperature(df['MOTOR_TEMPERATURE'])
+
+        fig, ax = plt.subplots(4, 1, figsize=(10, 14), sharex=True)
+        df.plot(x='TIME', y=['POSITION'], ax=ax[0])
+        df.plot(x='TIME', y=['TORQUE', 'CONTROL_TORQUE'], ax=ax[1])
+        df.plot(x='TIME', y=['Q_CURRENT'], ax=ax[2])
+        df.plot(x='TIME', y=['TEMPERATURE', 'MOTOR_TEMPERATURE'], ax=ax[3])
+
+        plt.show()
+    return df
+
+
+if __name__ == '__main__':
+    STIFFNESS_TEST_TORQUE = 90.0          # Nm at output
+    STIFFNESS_TEST_DURATION = 8.0
+    STIFFNESS_TEST_REPETITIONS = 2
+    MOTOR_TEMPERATURE_LIMIT = 80.0        # C, abort a ramp when the thermal model predicts this within 3s
+    MAX_DEVIATION = 0.3    # measured in output revolutions    
+
+
+    print('\nStarting torque ramp test')
+    print(f'torque test: {STIFFNESS_TEST_TORQUE}Nm, {STIFFNESS_TEST_DURATION}s, {STIFFNESS_TEST_REPETITIONS} repetitions')
+    print('')
+    test_name = input('Enter test name: ')
 
-    # plot
-    fig, ax = plt.subplots(4, 1, figsize=(10, 14), sharex=True)
-    df.plot(x='TIME', y=['POSITION'], ax=ax[0])
-    df.plot(x='TIME', y=['TORQUE', 'CONTROL_TORQUE'], ax=ax[1])
-    df.plot(x='TIME', y=['Q_CURRENT'], ax=ax[2])
-    df.plot(x='TIME', y=['TEMPERATURE', 'MOTOR_TEMPERATURE'], ax=ax[3])
+    if test_name == '':
+        print('No test name given, exiting')
+        exit()
 
-    plt.show()
+    max_torque_test(test_name, STIFFNESS_TEST_TORQUE, STIFFNESS_TEST_DURATION, STIFFNESS_TEST_REPETITIONS,
+                    MOTOR_TEMPERATURE_LIMIT, MAX_DEVIATION)
     
     print('Done')
-
@@ -5,26 +5,28 @@ Do a (very) slow speed ramp and record torque. Used to estimate friction
 import time, datetime
 import math
 
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-
 import asyncio
 from actuator import Actuator
 
+
+STORED_DATA = ['POSITION', 'VELOCITY', 'TORQUE', 'Q_CURRENT', 'FAULT', 'CONTROL_VELOCITY']
+
+
 async def do_speed_ramp(actuator, duration, max_speed):
     # ramp up and down till max speed, then opositre direction
+    import pandas as pd
 
     accel = max_speed / (duration/4)
 
     states = []
-    start_time = time.monotonic_ns()
+    start_time = actuator.clock.monotonic_ns()
     speed = max_speed
 
     print_progress = 0.1
 
     while True:
-        pct_done = (time.monotonic_ns() - start_time) / (duration*1e9)
+        cycle_start = time.perf_counter_ns()
+        pct_done = (actuator.clock.monotonic_ns() - start_time) / (duration*1e9)
         if pct_done > 0.25:
             speed = -max_speed
         if pct_done > 0.75:
@@ -35,7 +37,7 @@ async def do_speed_ramp(actuator, duration, max_speed):
             print(f'{pct_done*100:.0f}% done')
             print_progress += 0.1
         result = await actuator.set_position(math.nan, speed, accel_limit=accel, velocity_limit=max_speed)
-        state = actuator.state_to_dict(result, time.monotonic_ns())
+        state = actuator.state_to_dict(result, actuator.clock.monotonic_ns())
         states.append(state)
 
         if state['FAULT'] != 0:
@@ -44,7 +46,10 @@ async def do_speed_ramp(actuator, duration, max_speed):
             df['TIME'] = (df['TIME'] - start_time) / 1e9
             return df
 
-        await asyncio.sleep(0.0005)
+        await actuator.clock.sleep(0.0005)
+
+        if actuator.tracer is not None:
+            actuator.tracer.record('cycle', cycle_start, time.perf_counter_ns())
     
     await actuator.slow_down()
     await actuator.stop_and_zero()
@@ -53,11 +58,36 @@ async def do_speed_ramp(actuator, duration, max_speed):
     df['TIME'] = (df['TIME'] - start_time) / 1e9
     return df
 
+def speed_ramp_test(test_name, duration, max_speed, trace=False, plot=True, actuator_id=1):
+    actuator = Actuator(actuator_id, STORED_DATA)
+    if trace:
+        actuator.enable_tracing()
+
+    df = asyncio.run(do_speed_ramp(actuator, duration, max_speed))
+    print(f'Done, datarate was {len(df)/duration:.2f} Hz')
+
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d__%H-%M-%S')
+    filename = f'test_data/{timestamp}_speedramp_{test_name}_{duration}s.csv'
+    print(f'Saving data to {filename}')
+    df.to_csv(filename, index=False)
+
+    if trace:
+        actuator.tracer.print_summary()
+        actuator.tracer.to_chrome_trace(filename.replace('.csv', '_trace.json'))
+
+    if plot:
+        import matplotlib.pyplot as plt
+        df.plot(x='TIME', y=['TORQUE', 'Q_CURRENT'])
+        df.plot(x='TIME', y=['VELOCITY', 'CONTROL_VELOCITY'])
+        df.plot(x='VELOCITY', y='TORQUE', kind='scatter')
+        plt.show()
+    return df
+
+
 if __name__ == '__main__':
     TEST_DURATION = 60
     TOP_SPEED = 2.1
-    
-    STORED_DATA = ['POSITION', 'VELOCITY', 'TORQUE', 'Q_CURRENT', 'FAULT', 'CONTROL_VELOCITY']	
+    TRACE = False   # time each phase of the control loop, to find the cause of a low datarate
 
     print(f'\nRunning speed ramp test for {TEST_DURATION} seconds going upto {TOP_SPEED} rev/s at output')
     test_name = input('Enter test name: ')
@@ -66,18 +96,4 @@ if __name__ == '__main__':
         print('No test name given, exiting')
         exit()
 
-    actuator = Actuator(1, STORED_DATA)
-
-    df = asyncio.run(do_speed_ramp(actuator, TEST_DURATION, TOP_SPEED))
-    print(f'Done, datarate was {len(df)/TEST_DURATION:.2f} Hz')
-
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d__%H-%M-%S')
-    filename = f'test_data/{timestamp}_speedramp_{test_name}_{TEST_DURATION}s.csv'
-    print(f'Saving data to {filename}')
-    df.to_csv(filename, index=False)
-    df.plot(x='TIME', y=['TORQUE', 'Q_CURRENT'])
-    df.plot(x='TIME', y=['VELOCITY', 'CONTROL_VELOCITY'])
-    df.plot(x='VELOCITY', y='TORQUE', kind='scatter')
-    plt.show()
-    
-    
+    speed_ramp_test(test_name, TEST_DURATION, TOP_SPEED, TRACE)
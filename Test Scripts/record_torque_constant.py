@@ -6,10 +6,6 @@ import time, datetime
 import math
 from threading import Thread
 
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-
 import asyncio
 from actuator import Actuator
 import socket
@@ -96,15 +92,12 @@ async def do_torque_ramp(actuator: Actuator, duration, max_torque):
         return succes, states
     
 
-def main():
+def main(ramp_duration=5.0, max_torque=1.0, actuator_id=1):
     global poll_mini40, mini40_data
 
-    ramp_duration = 5.0
-    max_torque = 1.0
-
 
     STORED_DATA = ['POSITION', 'TORQUE', 'CONTROL_TORQUE', 'Q_CURRENT', 'FAULT']
-    actuator = Actuator(actuator_id=1, stored_data=STORED_DATA)
+    actuator = Actuator(actuator_id=actuator_id, stored_data=STORED_DATA)
     
     # set position to zero
     asyncio.run(actuator.m.set_output_nearest(position=0.0))
@@ -138,6 +131,7 @@ def main():
     
 
     # data to dfs
+    import pandas as pd
     columns = ['TIME', 'RDT_SEQUENCE', 'FT_SEQUENCE', 'STATUS', 'FORCE_X', 'FORCE_Y', 'FORCE_Z', 'TORQUE_X', 'TORQUE_Y', 'TORQUE_Z']
     mini40_df = pd.DataFrame(mini40_data, columns=columns)
     mini40_df['TIME'] = mini40_df['TIME'] - abs_start_time
@@ -5,13 +5,12 @@ Do a slow torque ramp towards a small position change. Used to estimate internal
 import time, datetime
 import math
 
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-
 import asyncio
 from actuator import Actuator
 
+
+STORED_DATA = ['POSITION', 'TORQUE', 'CONTROL_TORQUE', 'Q_CURRENT', 'FAULT']
+
 abs_start_time = time.monotonic_ns()
 
 async def do_torque_ramp(actuator: Actuator, duration, max_torque):
@@ -23,15 +22,15 @@ async def do_torque_ramp(actuator: Actuator, duration, max_torque):
 
     try:
         print(f'Ramping to {max_torque} Nm in {ramp_duration} seconds.', end=' ', flush=True)
-        start_time = time.monotonic_ns()
+        start_time = actuator.clock.monotonic_ns()
         while True:
-            pct_done = (time.monotonic_ns() - start_time) / (ramp_duration*1e9)
+            pct_done = (actuator.clock.monotonic_ns() - start_time) / (ramp_duration*1e9)
             if pct_done > 1.0:
                 break
             torque = max_torque * pct_done
             result = await actuator.set_position(feedforward_torque=torque, kp_scale=0.0, kd_scale=0.0)
-            states.append(actuator.state_to_dict(result, time.monotonic_ns()))
-            await asyncio.sleep(0.001)
+            states.append(actuator.state_to_dict(result, actuator.clock.monotonic_ns()))
+            await actuator.clock.sleep(0.001)
             
         if states[-1]['FAULT'] != 0:
             print(f'fault code: {states[-1]["FAULT"]}, STOPPING')
@@ -39,15 +38,15 @@ async def do_torque_ramp(actuator: Actuator, duration, max_torque):
 
         #ramp down torque
         print(f'\tand back down', end=' ', flush=True)
-        start_time = time.monotonic_ns()
+        start_time = actuator.clock.monotonic_ns()
         while True:
-            pct_done = (time.monotonic_ns() - start_time) / (ramp_duration*1e9)
+            pct_done = (actuator.clock.monotonic_ns() - start_time) / (ramp_duration*1e9)
             if pct_done > 1.0:
                 break
             torque = max_torque * (1-pct_done)
             result = await actuator.set_position(feedforward_torque=torque, kp_scale=0.0, kd_scale=0.0)
-            states.append(actuator.state_to_dict(result, time.monotonic_ns()))
-            await asyncio.sleep(0.001)
+            states.append(actuator.state_to_dict(result, actuator.clock.monotonic_ns()))
+            await actuator.clock.sleep(0.001)
 
     except Exception as e:
         print(f'torqueramp failed. Error: {e}')
@@ -60,20 +59,27 @@ async def do_torque_ramp(actuator: Actuator, duration, max_torque):
         return succes, states
     
 
-def torque_ramp_test(actuator: Actuator, test_duration, max_torque):
+async def do_torque_ramps(actuator: Actuator, test_duration, max_torque):
+    # a positive and a negative ramp, the negative one only when the first succeeded
+    import pandas as pd
     ramp_duration = test_duration/2
-    pos_succes, pos_states = asyncio.run(do_torque_ramp(actuator, ramp_duration, max_torque))
-    test_df = pd.DataFrame(pos_states)
-    if pos_succes:
-        neg_succes, neg_states = asyncio.run(do_torque_ramp(actuator, ramp_duration, -max_torque))
-        test_df = pd.concat([test_df, pd.DataFrame(neg_states)])
-    
-    if not pos_succes or not neg_succes:
+    succes, states = await do_torque_ramp(actuator, ramp_duration, max_torque)
+    if succes:
+        succes, neg_states = await do_torque_ramp(actuator, ramp_duration, -max_torque)
+        states = states + neg_states
+    return succes, pd.DataFrame(states)
+
+
+def torque_ramp_test(actuator: Actuator, test_duration, max_torque, test_name):
+    succes, test_df = asyncio.run(do_torque_ramps(actuator, test_duration, max_torque))
+
+    if not succes:
         timestamp = datetime.datetime.now().strftime('%Y-%m-%d__%H-%M-%S')
         filename = f'test_data/{timestamp}__torquerampfailed__{test_name}.csv'
-        df.to_csv(filename, index=False)
+        test_df.to_csv(filename, index=False)
 
         print(f'Ramp failed, still saved data to {filename}')
+        import matplotlib.pyplot as plt
         test_df.plot(x='TIME', y='TORQUE')
         plt.show()
         exit()
@@ -83,65 +89,43 @@ def torque_ramp_test(actuator: Actuator, test_duration, max_torque):
 
 
 
-if __name__ == '__main__':    
-    PLAY_TEST_TORQUE = 4.0          # Nm at output
-    PLAY_TEST_DURATION = 4.0
-    PLAY_TEST_REPETITIONS = 5
-
-    STIFFNESS_TEST_TORQUE = 40.0          # Nm at output
-    STIFFNESS_TEST_DURATION = 20.0
-    STIFFNESS_TEST_REPETITIONS = 3
-
-    STORED_DATA = ['POSITION', 'TORQUE', 'CONTROL_TORQUE', 'Q_CURRENT', 'FAULT']
-
-
-    print('\nStarting torque ramp test')
-    print(f'play test: {PLAY_TEST_TORQUE}Nm, {PLAY_TEST_DURATION}s, {PLAY_TEST_REPETITIONS} repetitions')
-    print(f'stiffness test: {STIFFNESS_TEST_TORQUE}Nm, {STIFFNESS_TEST_DURATION}s, {STIFFNESS_TEST_REPETITIONS} repetitions')
-    print('')
-    test_name = input('Enter test name: ')
-
-    if test_name == '':
-        print('No test name given, exiting')
-        exit()
-
-
+def play_stiffness_test(test_name, play_torque, play_duration, play_repetitions,
+                        stiffness_torque, stiffness_duration, stiffness_repetitions,
+                        max_deviation=0.015, actuator_id=1):
     # initialize actuator
-    actuator = Actuator(actuator_id=1, stored_data=STORED_DATA)
+    actuator = Actuator(actuator_id=actuator_id, stored_data=STORED_DATA)
 
     # set position to zero
     asyncio.run(actuator.m.set_output_nearest(position=0.0))
 
-    #for safety, configure motion limits
-    MAX_DEVIATION = 0.015    # measured in output revolutions    
+    #for safety, configure motion limits, measured in output revolutions
     result = asyncio.run(actuator.set_position())
     asyncio.run(actuator.m.set_stop())
     cur_pos = actuator.state_to_dict(result)['POSITION']
-    print(f'Current position: {cur_pos}, setting bounds to {cur_pos-MAX_DEVIATION} to {cur_pos+MAX_DEVIATION}')
-    asyncio.run(actuator.set_position_bounds(cur_pos-MAX_DEVIATION, cur_pos+MAX_DEVIATION))
+    print(f'Current position: {cur_pos}, setting bounds to {cur_pos-max_deviation} to {cur_pos+max_deviation}')
+    asyncio.run(actuator.set_position_bounds(cur_pos-max_deviation, cur_pos+max_deviation))
 
 
     # move to a repeatable position:
-    succes, states = asyncio.run(do_torque_ramp(actuator, duration=1.0, max_torque=-PLAY_TEST_TORQUE))
+    succes, states = asyncio.run(do_torque_ramp(actuator, duration=1.0, max_torque=-play_torque))
     if not succes:
         print('Failed to move to repeatable position, is output fixed?')
         exit()
 
 
-    abs_start_time = time.monotonic_ns()
+    abs_start_time = actuator.clock.monotonic_ns()
     all_states = []
 
     # do multiple low torque ramps for the play calculations
-    last_max_time = 0
-    for i in range(PLAY_TEST_REPETITIONS):
-        test_df = torque_ramp_test(actuator, test_duration=PLAY_TEST_DURATION, max_torque=PLAY_TEST_TORQUE)
+    for i in range(play_repetitions):
+        test_df = torque_ramp_test(actuator, test_duration=play_duration, max_torque=play_torque, test_name=test_name)
         test_df['test_nr'] = i
         all_states.append(test_df)
         print(f'small ramp {i} done')
 
     # do a high torque ramp for the stiffness calculations
-    for i in range(STIFFNESS_TEST_REPETITIONS):
-        test_df = torque_ramp_test(actuator, test_duration=STIFFNESS_TEST_DURATION, max_torque=STIFFNESS_TEST_TORQUE)
+    for i in range(stiffness_repetitions):
+        test_df = torque_ramp_test(actuator, test_duration=stiffness_duration, max_torque=stiffness_torque, test_name=test_name)
         test_df['test_nr'] = i+100
         all_states.append(test_df)
         print(f'large ramp ramp {i} done')
@@ -153,6 +137,7 @@ if __name__ == '__main__':
 
 
     # store the data
+    import pandas as pd
     df = pd.concat(all_states)
     df['TIME'] = (df['TIME'] - abs_start_time) / 1e9
 
@@ -168,6 +153,33 @@ if __name__ == '__main__':
     # df['position [deg]'] = df['POSITION'] * 360
     # df.plot(x='TORQUE', y='position [deg]', kind='scatter')
     # plt.show()
+    return df
+
+
+if __name__ == '__main__':    
+    PLAY_TEST_TORQUE = 4.0          # Nm at output
+    PLAY_TEST_DURATION = 4.0
+    PLAY_TEST_REPETITIONS = 5
+
+    STIFFNESS_TEST_TORQUE = 40.0          # Nm at output
+    STIFFNESS_TEST_DURATION = 20.0
+    STIFFNESS_TEST_REPETITIONS = 3
+
+    MAX_DEVIATION = 0.015    # measured in output revolutions    
+
+
+    print('\nStarting torque ramp test')
+    print(f'play test: {PLAY_TEST_TORQUE}Nm, {PLAY_TEST_DURATION}s, {PLAY_TEST_REPETITIONS} repetitions')
+    print(f'stiffness test: {STIFFNESS_TEST_TORQUE}Nm, {STIFFNESS_TEST_DURATION}s, {STIFFNESS_TEST_REPETITIONS} repetitions')
+    print('')
+    test_name = input('Enter test name: ')
+
+    if test_name == '':
+        print('No test name given, exiting')
+        exit()
+
+    play_stiffness_test(test_name, PLAY_TEST_TORQUE, PLAY_TEST_DURATION, PLAY_TEST_REPETITIONS,
+                        STIFFNESS_TEST_TORQUE, STIFFNESS_TEST_DURATION, STIFFNESS_TEST_REPETITIONS,
+                        MAX_DEVIATION)
     
     print('Done')
-
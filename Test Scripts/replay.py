@@ -0,0 +1,305 @@
+'''
+Deterministic replay of recorded test data through the test scripts themselves.
+
+A ReplayController stands in for moteus.Controller and answers every command with the
+next row of a recorded CSV from test_data/. It is passed to Actuator(controller=...), so
+the recording loops of the test scripts run unchanged: the run-in logger, the torque and
+speed ramps, the waypoint and streamed trajectories, the thermal model, the live monitor, tracing and the DataFrame building.
+Its clock is the recorded time of the last answered sample, so the time based parts of
+those loops (ramp phases, direction changes, print intervals) step like they did on the
+rig, whether the replay runs as fast as possible or at a multiple of the recorded speed.
+
+The test is recognised from the file name, or chosen with --test:
+    python replay.py test_data/<file>_run-in_<name>.csv           # as fast as possible
+    python replay.py test_data/<file>__torqueramp__<name>.csv --speed 1    # real time
+    python replay.py test_data/<file>_trajectory_<name>.csv --speed 2
+    python replay.py test_data/<file>.csv --test max-torque --temperature-limit 70
+'''
+
+import os
+import math
+import time
+import asyncio
+import argparse
+import tempfile
+import importlib
+
+import numpy as np
+import pandas as pd
+import moteus
+
+from actuator import Actuator
+from logs import read_log
+
+
+class ReplayResult:
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = values
+
+
+class ReplayCommand:
+    def __init__(self, controller):
+        self.controller = controller
+
+    def parse(self, *args):
+        return self.controller.next_result()
+
+
+class ReplayClock:
+    # recorded time of the last answered sample, in place of the wall and monotonic clock
+    def __init__(self, controller):
+        self.controller = controller
+
+    def time(self):
+        return self.controller.timestamp
+
+    def time_ns(self):
+        return round(self.controller.timestamp * 1e9)
+
+    def monotonic_ns(self):
+        return self.time_ns()
+
+    async def sleep(self, seconds):
+        # the sleeps of the test loops are part of the recorded sample times
+        pass
+
+
+class ReplayController:
+    '''
+    Stand in for moteus.Controller, which answers every command with the next recorded state.
+    speed is the replay speed relative to the recording, None for as fast as possible.
+    The recording is converted to results a chunk of samples at a time, each command is
+    answered with a single sample like on the rig.
+    Past the end of the recording it keeps answering with the last state while its clock
+    runs on at the recorded rate, so the time based loops of the scripts end normally.
+    '''
+    def __init__(self, df, registers, speed=None, chunk=2**16):
+        self.registers = [moteus.Register[register] for register in registers]
+        self.values = df[list(registers)].to_numpy(dtype=float)
+        self.times = df['TIME'].tolist()
+        self.period = float(np.diff(df['TIME']).mean()) if len(df) > 1 else 0.001
+        self.speed = speed
+        self.chunk = chunk
+        self.clock = ReplayClock(self)
+
+        self.results = self.recorded_results()
+        self.last = None
+        self.index = 0
+        self.extra = 0
+        self.start_time = None
+
+    @property
+    def done(self):
+        return self.index >= len(self.times)
+
+    @property
+    def timestamp(self):
+        if self.index == 0:
+            return self.times[0]
+        return self.times[self.index - 1] + self.extra * self.period
+
+    def recorded_results(self):
+        # converted a chunk at a time, a multi hour log does not fit in memory as dicts
+        registers = self.registers
+        for start in range(0, len(self.times), self.chunk):
+            for row in self.values[start:start + self.chunk].tolist():
+                yield ReplayResult(dict(zip(registers, row)))
+
+    def next_result(self):
+        if self.index < len(self.times):
+            self.last = next(self.results)
+            self.index += 1
+        else:
+            self.extra += 1
+        return self.last
+
+    async def wait_for_sample(self):
+        if self.start_time is None:
+            self.start_time = time.monotonic()
+        next_time = self.times[self.index] if self.index < len(self.times) else self.timestamp + self.period
+        delay = next_time / self.speed - (time.monotonic() - self.start_time)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def set_position(self, *args, **kwargs):
+        if self.speed is not None:
+            await self.wait_for_sample()
+        return self.next_result()
+
+    def make_position(self, *args, **kwargs):
+        return ReplayCommand(self)
+
+    async def execute(self, command):
+        if self.speed is not None:
+            await self.wait_for_sample()
+        return command.parse()
+
+    async def query(self, *args, **kwargs):
+        return await self.set_position()
+
+    async def set_stop(self, *args, **kwargs):
+        pass
+
+    async def set_output_nearest(self, *args, **kwargs):
+        pass
+
+    async def set_position_wait_complete(self, *args, **kwargs):
+        pass
+
+
+def replay_actuator(df, speed=None):
+    # an Actuator on the recorded registers of df
+    stored_data = [column for column in df.columns if column in moteus.Register.__members__]
+    return Actuator(stored_data=stored_data, controller=ReplayController(df, stored_data, speed))
+
+
+def replay_run_in(actuator, df, args):
+    # the run-in logger writes its own file, read it back
+    run_in = importlib.import_module('record-run-in')
+    speed = round(float(df['VELOCITY'].abs().median()), 2) if 'VELOCITY' in df else 0.0
+    asyncio.run(run_in.run_at_speed(actuator, speed, args.output, duration=df['TIME'].iloc[-1]))
+    return read_log(args.output)
+
+
+def replay_torque_ramps(actuator, df, module):
+    # one torque_ramp_test per recorded repetition, with its recorded duration and peak
+    results = []
+    for test_nr, ramp in df.groupby('test_nr', sort=False):
+        duration = ramp['TIME'].iloc[-1] - ramp['TIME'].iloc[0]
+        max_torque = ramp['CONTROL_TORQUE' if 'CONTROL_TORQUE' in ramp else 'TORQUE'].abs().max()
+        test_df = module.torque_ramp_test(actuator, duration, max_torque, 'replay')
+        test_df['test_nr'] = test_nr
+        results.append(test_df)
+    return pd.concat(results)
+
+
+def replay_torqueramp(actuator, df, args):
+    import record_torqueramp
+    return replay_torque_ramps(actuator, df, record_torqueramp)
+
+
+def replay_max_torque(actuator, df, args):
+    import record_max_torque
+    from thermal import ThermalModel
+    record_max_torque.thermal_model = ThermalModel.load(limit=args.temperature_limit, horizon=3.0)
+    return replay_torque_ramps(actuator, df, record_max_torque)
+
+
+def recorded_commands(df):
+    # the waypoints of a record_trajectory() run. Each command is sent until
+    # TRAJECTORY_COMPLETE, from its second sample on, so the recording splits into commands.
+    # Only the commanded position is recorded, the replay does not need the limits
+    complete = df['TRAJECTORY_COMPLETE'].to_numpy() != 0
+    commanded = df['COMMAND_POSITION'].to_numpy()
+    commands = []
+    start = 0
+    while start < len(df):
+        end = min(start + 1, len(df) - 1)
+        while end < len(df) - 1 and not complete[end]:
+            end += 1
+        commands.append({'position': commanded[end]})
+        start = end + 1
+    return commands
+
+
+def recorded_plan(df, settle_time=0.5, rate=1000):
+    # the plan a stream_trajectory() run played out, from its PLAN_POSITION. It ends
+    # settle_time before the last sample, so the stream stops on that sample
+    period = float(np.diff(df['TIME']).mean())
+    end = df['TIME'].iloc[-1] - settle_time - period / 2
+    t = np.linspace(0, end, math.ceil(end * rate) + 1)
+    position = np.interp(t, df['TIME'], df['PLAN_POSITION'])
+    velocity = np.gradient(position) * rate
+    return pd.DataFrame({'TIME': t, 'POSITION': position, 'VELOCITY': velocity,
+                         'ACCELERATION': np.gradient(velocity) * rate, 'FEEDFORWARD_TORQUE': np.zeros(len(t))})
+
+
+def replay_trajectory(actuator, df, args):
+    # streamed trajectories record the planned position, waypoint runs do not
+    if 'PLAN_POSITION' in df:
+        from trajectory import stream_trajectory
+        return asyncio.run(stream_trajectory(actuator, recorded_plan(df)))
+    from record_trajectory import record_trajectory
+    return asyncio.run(record_trajectory(actuator, recorded_commands(df)))
+
+
+def replay_speedramp(actuator, df, args):
+    from record_speedramp import do_speed_ramp
+    # the ramp ends after the first sample past its duration
+    duration = df['TIME'].iloc[-1] - actuator.m.period / 2
+    return asyncio.run(do_speed_ramp(actuator, duration, df['CONTROL_VELOCITY'].abs().max()))
+
+
+TESTS = {
+    'run-in': replay_run_in,
+    'torqueramp': replay_torqueramp,
+    'max-torque': replay_max_torque,
+    'speedramp': replay_speedramp,
+    'trajectory': replay_trajectory,
+}
+
+
+def test_from_filename(filename, df):
+    name = os.path.basename(filename)
+    if '_run-in_' in name:
+        return 'run-in'
+    if '_speedramp_' in name:
+        return 'speedramp'
+    if '_trajectory_' in name:
+        return 'trajectory'
+    if '__torqueramp' in name:
+        # record_max_torque.py saves under the same name, with the temperatures
+        return 'max-torque' if 'MOTOR_TEMPERATURE' in df else 'torqueramp'
+    return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a recorded test CSV through its test script')
+    parser.add_argument('filename')
+    parser.add_argument('--test', choices=list(TESTS), default=None, help='test script to replay through, default from the file name')
+    parser.add_argument('--speed', type=float, default=None, help='replay speed relative to the recording, default as fast as possible')
+    parser.add_argument('--output', default=None, help='file for the replayed run-in log, default a temporary file')
+    parser.add_argument('--temperature-limit', type=float, default=80.0, help='C, thermal limit of the max-torque replay')
+    parser.add_argument('--trace', action='store_true', help='print the latency trace summary')
+    parser.add_argument('--monitor', action='store_true', help='show the live monitor during replay')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = read_log(args.filename)
+    print(f'Loaded {len(df)} samples ({df["TIME"].iloc[-1]:.1f}s recorded) in {time.perf_counter()-start:.2f}s')
+
+    test = args.test or test_from_filename(args.filename, df)
+    if test is None:
+        parser.error('cannot tell the test from the file name, choose one with --test')
+
+    actuator = replay_actuator(df, args.speed)
+    if args.trace:
+        actuator.enable_tracing()
+    if args.monitor:
+        actuator.start_monitor()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.output is None:
+            args.output = os.path.join(directory, 'run-in.csv')
+
+        start = time.perf_counter()
+        with actuator:
+            replayed = TESTS[test](actuator, df, args)
+        duration = time.perf_counter() - start
+
+    # the replayed states have to match the recording, at the F32 resolution of the registers
+    columns = actuator.stored_data
+    n = min(len(replayed), len(df))
+    matches = np.array_equal(replayed[columns].to_numpy(dtype=np.float32)[:n],
+                             df[columns].to_numpy(dtype=np.float32)[:n], equal_nan=True)
+    controller = actuator.m
+    print(f'Replayed {controller.index} of {len(df)} samples through {test} in {duration:.2f}s, '
+          f'{controller.index/duration:.0f} samples/s, {df["TIME"].iloc[-1]/duration:.0f}x real time')
+    if controller.extra:
+        print(f'The test ran {controller.extra} samples past the end of the recording')
+    print(f'Replay {"matches" if matches else "DOES NOT MATCH"} the recording')
+
+    if args.trace:
+        actuator.tracer.print_summary()
@@ -0,0 +1,132 @@
+'''
+Single command line entry point for the rig tests, with the parameters as flags instead
+of constants and input() prompts in each script.
+
+Only argparse is imported at start up, each subcommand imports its test script when it
+runs. The test scripts import pandas and matplotlib only when saving and plotting, so the
+first command is on the bus a fraction of a second after start.
+
+    python rig.py demo
+    python rig.py trajectory pendulum_700gr --stream --jerk-limit 150 --inertia 0.02
+    python rig.py speedramp baseline --duration 60 --max-speed 2.1 --trace
+    python rig.py torqueramp onyx --stiffness-torque 40
+    python rig.py max-torque pccf --torque 90 --temperature-limit 80
+    python rig.py torque-constant --torque 1.0
+    python rig.py run-in onyx --speed 0.35 --duration 3600
+    python rig.py <subcommand> --help
+'''
+
+import argparse
+import importlib
+
+
+def demo(args):
+    from record_trajectory import trajectory_test, POSITIONS
+    trajectory_test('demo', [1.0, 3.0, 6.0, 8.0, 10], POSITIONS, max_velocity=1.1, pos_offset=-0.6,
+                    stream=args.stream, jerk_limit=args.jerk_limit, save=False, plot=False,
+                    actuator_id=args.id)
+
+
+def trajectory(args):
+    from record_trajectory import trajectory_test
+    trajectory_test(args.name, args.accels, args.positions, args.max_velocity, args.offset,
+                    stream=args.stream, jerk_limit=args.jerk_limit, inertia=args.inertia,
+                    plot=not args.no_plot, actuator_id=args.id)
+
+
+def speedramp(args):
+    from record_speedramp import speed_ramp_test
+    speed_ramp_test(args.name, args.duration, args.max_speed, args.trace, plot=not args.no_plot,
+                    actuator_id=args.id)
+
+
+def torqueramp(args):
+    from record_torqueramp import play_stiffness_test
+    play_stiffness_test(args.name, args.play_torque, args.play_duration, args.play_repetitions,
+                        args.stiffness_torque, args.stiffness_duration, args.stiffness_repetitions,
+                        args.max_deviation, actuator_id=args.id)
+
+
+def max_torque(args):
+    from record_max_torque import max_torque_test
+    max_torque_test(args.name, args.torque, args.duration, args.repetitions, args.temperature_limit,
+                    args.max_deviation, plot=not args.no_plot, actuator_id=args.id)
+
+
+def torque_constant(args):
+    from record_torque_constant import main
+    main(args.duration, args.torque, actuator_id=args.id)
+
+
+def run_in(args):
+    importlib.import_module('record-run-in').run_in_test(args.name, args.speed, args.duration, actuator_id=args.id)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Run a test on the actuator rig')
+    parser.add_argument('--id', type=int, default=1, help='moteus controller id')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('demo', help='trajectory demo, nothing saved')
+    p.add_argument('--jerk-limit', type=float, default=200.0, help='rev/s^3 at output')
+    p.add_argument('--stream', action='store_true', help='stream a jerk limited trajectory through the waypoints instead of single waypoints')
+    p.set_defaults(func=demo)
+
+    p = subparsers.add_parser('trajectory', help='trajectory tracking at increasing accelerations')
+    p.add_argument('name', help='test name, part of the file name')
+    p.add_argument('--accels', type=float, nargs='+', default=[1.0, 3.0, 6.0, 8.0, 10, 1.0], help='rev/s^2 at output')
+    p.add_argument('--positions', type=float, nargs='+', default=[0.0, 0.07, 0.14, 0.21, 0.5, 0.2, 0.4, 0.0], help='rev at output')
+    p.add_argument('--max-velocity', type=float, default=1.1, help='rev/s at output')
+    p.add_argument('--offset', type=float, default=-0.6, help='added to all positions, rev at output')
+    p.add_argument('--jerk-limit', type=float, default=200.0, help='rev/s^3 at output')
+    p.add_argument('--inertia', type=float, default=0.0, help='kg m^2 at output, torque feedforward of the streamed trajectory')
+    p.add_argument('--stream', action='store_true', help='stream a jerk limited trajectory through the waypoints instead of single waypoints')
+    p.add_argument('--no-plot', action='store_true')
+    p.set_defaults(func=trajectory)
+
+    p = subparsers.add_parser('speedramp', help='slow speed ramp for friction')
+    p.add_argument('name', help='test name, part of the file name')
+    p.add_argument('--duration', type=float, default=60, help='s')
+    p.add_argument('--max-speed', type=float, default=2.1, help='rev/s at output')
+    p.add_argument('--trace', action='store_true', help='time each phase of the control loop')
+    p.add_argument('--no-plot', action='store_true')
+    p.set_defaults(func=speedramp)
+
+    p = subparsers.add_parser('torqueramp', help='torque ramps for play and stiffness, output fixed')
+    p.add_argument('name', help='test name, part of the file name')
+    p.add_argument('--play-torque', type=float, default=4.0, help='Nm at output')
+    p.add_argument('--play-duration', type=float, default=4.0, help='s')
+    p.add_argument('--play-repetitions', type=int, default=5)
+    p.add_argument('--stiffness-torque', type=float, default=40.0, help='Nm at output')
+    p.add_argument('--stiffness-duration', type=float, default=20.0, help='s')
+    p.add_argument('--stiffness-repetitions', type=int, default=3)
+    p.add_argument('--max-deviation', type=float, default=0.015, help='position bounds, rev at output')
+    p.set_defaults(func=torqueramp)
+
+    p = subparsers.add_parser('max-torque', help='high torque ramps with thermal limit, output fixed')
+    p.add_argument('name', help='test name, part of the file name')
+    p.add_argument('--torque', type=float, default=90.0, help='Nm at output')
+    p.add_argument('--duration', type=float, default=8.0, help='s')
+    p.add_argument('--repetitions', type=int, default=2)
+    p.add_argument('--temperature-limit', type=float, default=80.0, help='C, abort when predicted within 3s')
+    p.add_argument('--max-deviation', type=float, default=0.3, help='position bounds, rev at output')
+    p.add_argument('--no-plot', action='store_true')
+    p.set_defaults(func=max_torque)
+
+    p = subparsers.add_parser('torque-constant', help='torque ramp measured with the mini40 loadcell')
+    p.add_argument('--torque', type=float, default=1.0, help='Nm at output')
+    p.add_argument('--duration', type=float, default=5.0, help='s')
+    p.set_defaults(func=torque_constant)
+
+    p = subparsers.add_parser('run-in', help='run in alternating directions until q or the duration')
+    p.add_argument('name', help='test name, part of the file name')
+    p.add_argument('--speed', type=float, default=0.35, help='rev/s at output')
+    p.add_argument('--duration', type=float, default=None, help='s, default until q')
+    p.set_defaults(func=run_in)
+
+    return parser
+
+
+if __name__ == '__main__':
+    args = make_parser().parse_args()
+    args.func(args)
@@ -0,0 +1,206 @@
+'''
+Run a queue of tests back to back in a single actuator session, unattended.
+
+Before every test (and every torque ramp repetition) the motor temperature is checked.
+Only when it is above COOLDOWN_START the motor is stopped until it has cooled down to
+COOLDOWN_END, otherwise the next test starts right away. The campaign stops when a test
+reports a fault, or when the motor does not cool down within COOLDOWN_TIMEOUT. The
+run-in checks for faults and TEMPERATURE_LIMIT every 10 seconds while it runs.
+
+The campaign is the CAMPAIGN list below, or a JSON file with the same list of dicts:
+    python run_campaign.py [campaign.json]
+'''
+
+import sys
+import json
+import time, datetime
+import importlib
+
+import pandas as pd
+
+import asyncio
+from actuator import Actuator
+from calibration import calibrated_motor_temperature
+from record_torqueramp import do_torque_ramp, do_torque_ramps
+from record_speedramp import do_speed_ramp
+from record_trajectory import record_trajectory, trajectory_commands
+from trajectory import plan_trajectory, stream_trajectory
+run_in = importlib.import_module('record-run-in')
+
+
+COOLDOWN_START = 70.0   # C, calibrated motor temperature
+COOLDOWN_END = 50.0     # C
+COOLDOWN_POLL = 10.0    # s
+COOLDOWN_TIMEOUT = 1800.0   # s, the campaign stops when the motor is still hot by then
+TEMPERATURE_LIMIT = 80.0    # C, stops a running run-in
+
+STORED_DATA = [ 'POSITION', 'CONTROL_POSITION', 'COMMAND_POSITION',
+                'VELOCITY', 'CONTROL_VELOCITY', 'COMMAND_VELOCITY',
+                'TORQUE', 'CONTROL_TORQUE', 'Q_CURRENT',
+                'FAULT', 'TRAJECTORY_COMPLETE',
+                'TEMPERATURE', 'MOTOR_TEMPERATURE',
+]
+
+# same plans as the individual test scripts. All tests share one mounting, the torque
+# ramps need a fixed output and cannot be mixed with the free running tests:
+#   {'test': 'torqueramp', 'max_torque': 4.0, 'duration': 4.0, 'repetitions': 5, 'max_deviation': 0.015, 'test_nr': 0},
+#   {'test': 'torqueramp', 'max_torque': 40.0, 'duration': 20.0, 'repetitions': 3, 'max_deviation': 0.015, 'test_nr': 100},
+CAMPAIGN = [
+    {'test': 'speedramp', 'duration': 60, 'max_speed': 2.1},
+    {'test': 'trajectory', 'accels': [1.0, 3.0, 6.0, 8.0, 10, 1.0], 'positions': [0.0, 0.07, 0.14, 0.21, 0.5, 0.2, 0.4, 0.0],
+     'max_velocity': 1.1, 'pos_offset': -0.6, 'stream': False, 'inertia': 0.0},
+    {'test': 'run-in', 'speed': 0.35, 'duration': 3600},
+]
+
+
+async def motor_temperature(actuator):
+    state = actuator.state_to_dict(await actuator.m.query())
+    return calibrated_motor_temperature(state['MOTOR_TEMPERATURE'])
+
+
+# False when the motor did not cool down within COOLDOWN_TIMEOUT
+async def wait_for_cooldown(actuator):
+    temperature = await motor_temperature(actuator)
+    if temperature <= COOLDOWN_START:
+        return True
+
+    print(f'Motor at {temperature:.1f}C, cooling down to {COOLDOWN_END:.0f}C', end=' ', flush=True)
+    await actuator.m.set_stop()
+    start_time = time.time()
+    while temperature > COOLDOWN_END:
+        if time.time() - start_time > COOLDOWN_TIMEOUT:
+            print(f' still at {temperature:.1f}C after {COOLDOWN_TIMEOUT:.0f}s')
+            return False
+        await asyncio.sleep(COOLDOWN_POLL)
+        temperature = await motor_temperature(actuator)
+        print('.', end='', flush=True)
+    print(f' done after {time.time() - start_time:.0f}s')
+    return True
+
+
+def run_in_check(state):
+    # called by the run-in every print interval, faults stay set until the controller is stopped
+    if state.get('FAULT', 0) != 0:
+        print(f'Fault detected: {state["FAULT"]}')
+        return False
+    temperature = calibrated_motor_temperature(state['MOTOR_TEMPERATURE'])
+    if temperature > TEMPERATURE_LIMIT:
+        print(f'Motor at {temperature:.1f}C, above {TEMPERATURE_LIMIT:.0f}C')
+        return False
+    return True
+
+
+async def run_torqueramp(actuator, test, filename):
+    # bounds around the current position, the output is expected to be fixed
+    await actuator.m.set_output_nearest(position=0.0)
+    cur_pos = actuator.state_to_dict(await actuator.m.query())['POSITION']
+    await actuator.set_position_bounds(cur_pos-test['max_deviation'], cur_pos+test['max_deviation'])
+
+    abs_start_time = actuator.clock.monotonic_ns()
+    all_states = []
+
+    # move to a repeatable position
+    succes, states = await do_torque_ramp(actuator, duration=1.0, max_torque=-test['max_torque'])
+    if not succes:
+        print('Failed to move to repeatable position, is output fixed?')
+
+    for i in range(test['repetitions']):
+        if not succes:
+            break
+        succes = await wait_for_cooldown(actuator)
+        if not succes:
+            break
+        succes, test_df = await do_torque_ramps(actuator, test['duration'], test['max_torque'])
+        test_df['test_nr'] = test['test_nr'] + i
+        all_states.append(test_df)
+
+    await actuator.m.set_stop()
+    await actuator.set_position_bounds('nan', 'nan')
+
+    df = pd.concat(all_states) if all_states else pd.DataFrame(columns=['TIME'])
+    df['TIME'] = (df['TIME'] - abs_start_time) / 1e9
+    return succes, df
+
+
+async def run_speedramp(actuator, test, filename):
+    df = await do_speed_ramp(actuator, test['duration'], test['max_speed'])
+    return True, df
+
+
+async def run_trajectory(actuator, test, filename):
+    commands = trajectory_commands(test['accels'], test['positions'], test['max_velocity'], test['pos_offset'])
+
+    if test.get('stream', False):
+        start_position = actuator.state_to_dict(await actuator.m.query())['POSITION']
+        plan = plan_trajectory(commands, start_position, jerk_limit=test.get('jerk_limit', 200.0),
+                               inertia=test.get('inertia', 0.0))
+        df = await stream_trajectory(actuator, plan)
+    else:
+        df = await record_trajectory(actuator, commands)
+    df['TIME'] = (df['TIME'] - df['TIME'].iloc[0]) / 1e9
+    return True, df
+
+
+async def run_run_in(actuator, test, filename):
+    # writes its own file while running, no DataFrame to save
+    succes = await run_in.run_at_speed(actuator, test['speed'], filename, test['duration'], check=run_in_check)
+    return succes, None
+
+
+RUNNERS = {
+    'torqueramp': run_torqueramp,
+    'speedramp': run_speedramp,
+    'trajectory': run_trajectory,
+    'run-in': run_run_in,
+}
+
+
+async def run_campaign(actuator, campaign, name):
+    for i, test in enumerate(campaign):
+        if not await wait_for_cooldown(actuator):
+            print('Motor did not cool down, stopping campaign')
+            return False
+
+        print(f'\nTest {i+1}/{len(campaign)}: {test}')
+        timestamp = datetime.datetime.now().strftime('%Y-%m-%d__%H-%M-%S')
+        filename = f'test_data/{timestamp}__{test["test"]}__{name}_{i}.csv'
+
+        succes, df = await RUNNERS[test['test']](actuator, test, filename)
+
+        if df is not None:
+            print(f'Saving data to {filename}')
+            df.to_csv(filename, index=False)
+
+        if df is not None and 'FAULT' in df and (df['FAULT'] != 0).any():
+            print(f'Fault detected: {df["FAULT"][df["FAULT"] != 0].iloc[0]}')
+            succes = False
+        if not succes:
+            print('Test failed, stopping campaign')
+            return False
+
+    return True
+
+
+if __name__ == '__main__':
+    campaign = CAMPAIGN
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            campaign = json.load(f)
+
+    print(f'\nStarting campaign of {len(campaign)} tests, cooling down above {COOLDOWN_START}C')
+    for test in campaign:
+        print(f'    {test}')
+    name = input('Enter campaign name: ')
+
+    if name == '':
+        print('No campaign name given, exiting')
+        exit()
+
+    with Actuator(actuator_id=1, stored_data=STORED_DATA) as actuator:
+        actuator.start_monitor(window=120)
+
+        start_time = time.time()
+        succes = asyncio.run(run_campaign(actuator, campaign, name))
+        asyncio.run(actuator.m.set_stop())
+
+    print(f'Campaign {"done" if succes else "stopped"} after {(time.time() - start_time)/3600:.2f} hours')
@@ -0,0 +1,134 @@
+'''
+Live telemetry monitor. The control loop writes every sample into a ring buffer in
+shared memory, a separate process reads the latest samples and renders rolling plots.
+Writing a sample is a single row copy, so the control loop never waits on rendering.
+
+Usage from a test script:
+    actuator = Actuator(1, STORED_DATA)
+    actuator.start_monitor()
+    ...  # every actuator.state_to_dict() call is now also sent to the monitor
+    actuator.stop_monitor()
+'''
+
+import math
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from calibration import calibrated_motor_temperature
+
+
+MONITOR_PLOTS = [
+    ['POSITION', 'CONTROL_POSITION', 'COMMAND_POSITION'],
+    ['TORQUE', 'CONTROL_TORQUE'],
+    ['Q_CURRENT'],
+    ['TEMPERATURE', 'MOTOR_TEMPERATURE'],
+]
+
+
+class TelemetryBuffer:
+    '''
+    Single writer, multiple reader ring buffer of float64 samples in shared memory.
+    The first column is always the monotonic write time in seconds.
+    The header holds the total number of written samples, it is updated after the
+    row itself so readers never see a row that is still being written.
+    '''
+    def __init__(self, columns, size=2**16, name=None):
+        self.columns = ['MONITOR_TIME'] + list(columns)
+        self.size = size
+
+        nbytes = 8 + size * len(self.columns) * 8
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+        self.count = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf, offset=0)
+        self.data = np.ndarray((size, len(self.columns)), dtype=np.float64, buffer=self.shm.buf, offset=8)
+        if self.owner:
+            self.count[0] = 0
+
+    def write(self, state):
+        count = int(self.count[0])
+        row = self.data[count % self.size]
+        row[0] = time.monotonic()
+        for i, column in enumerate(self.columns[1:], start=1):
+            value = state.get(column)
+            row[i] = math.nan if value is None else value
+        self.count[0] = count + 1
+
+    def latest(self, n):
+        # copy of the last n samples, oldest first. The oldest slot is skipped, the writer may be overwriting it
+        count = int(self.count[0])
+        n = min(n, count, self.size - 1)
+        rows = np.arange(count - n, count) % self.size
+        return self.data[rows].copy()
+
+    def close(self):
+        # release the numpy views before closing the shared memory
+        del self.count, self.data
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def run_monitor(name, columns, size, window=30.0, interval=0.1, max_points=5000):
+    # imported here so only the monitor process pays for matplotlib
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+    from downsample import minmax_indices
+
+    buffer = TelemetryBuffer(columns, size, name=name)
+    index = {column: i for i, column in enumerate(buffer.columns)}
+    plots = [[c for c in plot if c in index] for plot in MONITOR_PLOTS]
+    plots = [plot for plot in plots if plot]
+
+    fig, axs = plt.subplots(len(plots), 1, figsize=(10, 3*len(plots)), sharex=True, squeeze=False)
+    axs = axs[:, 0]
+    lines = []
+    for ax, plot in zip(axs, plots):
+        for column in plot:
+            line, = ax.plot([], [], label=column)
+            lines.append((ax, line, index[column], column))
+        ax.legend(loc='upper left')
+        ax.grid(True)
+    axs[-1].set_xlabel('time [s]')
+    axs[-1].set_xlim(-window, 0)
+
+    def update(frame):
+        samples = buffer.latest(size)
+        if len(samples) == 0:
+            return []
+        t = samples[:, 0] - time.monotonic()
+        samples = samples[t > -window]
+        t = t[t > -window]
+        for ax, line, i, column in lines:
+            values = samples[:, i]
+            if column == 'MOTOR_TEMPERATURE':
+                values = calibrated_motor_temperature(values)
+            # keep the peaks, a plain stride would hide short torque spikes
+            shown = minmax_indices(values, max_points // 2)
+            line.set_data(t[shown], values[shown])
+        for ax in axs:
+            ax.relim()
+            ax.autoscale_view(scalex=False)
+        return [line for _, line, _, _ in lines]
+
+    animation = FuncAnimation(fig, update, interval=interval*1000, cache_frame_data=False)
+    plt.show()
+    buffer.close()
+
+
+def start_monitor(columns, size=2**16, window=30.0):
+    buffer = TelemetryBuffer(columns, size)
+    process = multiprocessing.Process(
+        target=run_monitor,
+        args=(buffer.name, list(columns), size, window),
+        daemon=True,
+    )
+    process.start()
+    return buffer, process
@@ -0,0 +1,178 @@
+'''
+Online lumped thermal model of the motor winding.
+
+The winding is modelled as a single thermal mass heated by the copper losses (Q_CURRENT
+squared) and cooled towards ambient:
+    dT/dt = (gain * I^2 - (T - ambient)) / tau
+with gain [C/A^2] the steady state rise per squared amp and tau [s] the time constant.
+Each update propagates the model over the elapsed time and pulls it towards the
+measured (calibrated) MOTOR_TEMPERATURE with the time constant correction_time, so it
+stays correct when the parameters are off. The thermistor lags the winding, so the
+correction is slow compared to the heating during a ramp.
+
+From the state it predicts the temperature a few seconds ahead at the present current,
+the time until the limit is reached and the torque that can be held continuously.
+
+gain, tau and ambient are identified from a recorded test that heats the motor with
+fit_thermal_model(), and saved to THERMAL_PARAMETERS_FILE:
+    python thermal.py test_data/<file>.csv
+ThermalModel.load() reads them, or falls back to conservative defaults when the motor
+has not been fitted yet.
+'''
+
+import os
+import math
+import time
+import json
+import argparse
+
+from calibration import calibrated_motor_temperature
+
+
+THERMAL_PARAMETERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thermal_parameters.json')
+
+# used until the motor is fitted. Heats faster and further than the rough estimate of
+# gain=0.05, tau=300 and starts from a warm room, so the limit is predicted early
+DEFAULT_GAIN = 0.1      # C/A^2
+DEFAULT_TAU = 150.0     # s
+DEFAULT_AMBIENT = 35.0  # C
+
+
+class ThermalModel:
+    def __init__(self, gain=DEFAULT_GAIN, tau=DEFAULT_TAU, ambient=DEFAULT_AMBIENT, limit=80.0, horizon=3.0, correction_time=60.0):
+        self.gain = gain
+        self.tau = tau
+        self.ambient = ambient
+        self.limit = limit              # C, calibrated motor temperature
+        self.horizon = horizon          # s, look ahead for limit_predicted
+        self.correction_time = correction_time  # s, time constant of the pull towards the measurement
+
+        self.temperature = None
+        self.current = 0.0
+        self.torque_per_amp = None
+        self.last_time = None
+
+    def steady_state(self, current):
+        return self.ambient + self.gain * current**2
+
+    def update(self, state, timestamp=None):
+        now = time.monotonic() if timestamp is None else timestamp
+        measured = calibrated_motor_temperature(state['MOTOR_TEMPERATURE'])
+        self.current = state['Q_CURRENT']
+
+        if self.temperature is None:
+            self.temperature = measured
+        else:
+            # exact solution of the first order model over dt at constant current
+            dt = now - self.last_time
+            target = self.steady_state(self.current)
+            self.temperature = target + (self.temperature - target) * math.exp(-dt / self.tau)
+            # the same pull per second at any sample rate
+            self.temperature += (1 - math.exp(-dt / self.correction_time)) * (measured - self.temperature)
+        self.last_time = now
+
+        # output torque per amp, as reported by the controller
+        if 'TORQUE' in state and abs(self.current) > 1.0:
+            ratio = state['TORQUE'] / self.current
+            if self.torque_per_amp is None:
+                self.torque_per_amp = ratio
+            else:
+                self.torque_per_amp += 0.01 * (ratio - self.torque_per_amp)
+
+        return self.temperature
+
+    def predict(self, horizon=None, current=None):
+        # temperature after horizon seconds when holding the current (default the present one)
+        horizon = self.horizon if horizon is None else horizon
+        current = self.current if current is None else current
+        target = self.steady_state(current)
+        return target + (self.temperature - target) * math.exp(-horizon / self.tau)
+
+    def limit_predicted(self):
+        return self.predict() >= self.limit
+
+    def time_to_limit(self, current=None):
+        current = self.current if current is None else current
+        target = self.steady_state(current)
+        if self.temperature >= self.limit:
+            return 0.0
+        if target <= self.limit:
+            return math.inf
+        return -self.tau * math.log((target - self.limit) / (target - self.temperature))
+
+    def continuous_current(self):
+        # current that settles exactly at the limit
+        return math.sqrt(max(0.0, self.limit - self.ambient) / self.gain)
+
+    def continuous_torque(self):
+        if self.torque_per_amp is None:
+            return math.nan
+        return abs(self.torque_per_amp) * self.continuous_current()
+
+    @classmethod
+    def load(cls, filename=THERMAL_PARAMETERS_FILE, **kwargs):
+        # the fitted parameters, the conservative defaults when there are none
+        if not os.path.exists(filename):
+            print(f'No thermal parameters in {filename}, using the conservative defaults')
+            return cls(**kwargs)
+        with open(filename) as f:
+            parameters = json.load(f)
+        return cls(gain=parameters['gain'], tau=parameters['tau'], ambient=parameters['ambient'], **kwargs)
+
+    def save(self, filename=THERMAL_PARAMETERS_FILE):
+        with open(filename, 'w') as f:
+            json.dump({'gain': self.gain, 'tau': self.tau, 'ambient': self.ambient}, f, indent=1)
+
+    def status(self):
+        return (f'motor {self.temperature:.1f}C, in {self.horizon:.0f}s {self.predict():.1f}C, '
+                f'limit in {self.time_to_limit():.0f}s, continuous {self.continuous_torque():.1f}Nm')
+
+
+# Identify gain, tau and ambient from a recorded test with TIME [s], Q_CURRENT and MOTOR_TEMPERATURE.
+# The temperature register is coarse, so the model is fitted on changes over windows of
+# `window` seconds rather than on per-sample derivatives. The ambient is fitted along,
+# unless it is given, the test does not have to start from a cold motor.
+def fit_thermal_model(df, window=5.0, ambient=None, **kwargs):
+    import numpy as np
+    t = df['TIME'].to_numpy(dtype=float)
+    current2 = df['Q_CURRENT'].to_numpy(dtype=float)**2
+    temperature = calibrated_motor_temperature(df['MOTOR_TEMPERATURE'].to_numpy(dtype=float))
+
+    # window boundaries and the integrals in between, via cumulative integrals
+    edges = np.searchsorted(t, np.arange(t[0], t[-1], window))
+    dt = np.diff(t, prepend=t[0])
+    heat = np.concatenate(([0], np.cumsum(current2 * dt)))
+    rise = np.concatenate(([0], np.cumsum((temperature - (ambient or 0.0)) * dt)))
+
+    duration = t[edges[1:]] - t[edges[:-1]]
+    delta = temperature[edges[1:]] - temperature[edges[:-1]]
+    a = (heat[edges[1:]+1] - heat[edges[:-1]+1])
+    b = -(rise[edges[1:]+1] - rise[edges[:-1]+1])
+
+    # delta = (gain/tau) * a + (1/tau) * b [+ (ambient/tau) * duration]
+    valid = duration > 0
+    columns = (a, b) if ambient is not None else (a, b, duration)
+    fit = np.linalg.lstsq(np.column_stack(columns)[valid], delta[valid], rcond=None)[0]
+    tau = 1 / fit[1]
+    gain = fit[0] * tau
+    if ambient is None:
+        ambient = fit[2] * tau
+
+    return ThermalModel(gain=gain, tau=tau, ambient=ambient, **kwargs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit the thermal model on a recorded test and save its parameters')
+    parser.add_argument('filename', help='recorded test with TIME, Q_CURRENT and MOTOR_TEMPERATURE')
+    parser.add_argument('--window', type=float, default=5.0, help='s, fit on the changes over this window')
+    parser.add_argument('--ambient', type=float, default=None, help='C, measured room temperature, default fitted')
+    parser.add_argument('--output', default=THERMAL_PARAMETERS_FILE)
+    args = parser.parse_args()
+
+    from logs import read_log
+    model = fit_thermal_model(read_log(args.filename), args.window, args.ambient)
+    if not (model.gain > 0 and model.tau > 0):
+        print(f'Fit failed (gain={model.gain:.3g} C/A^2, tau={model.tau:.3g} s), the test has to heat the motor')
+        exit()
+    model.save(args.output)
+    print(f'gain={model.gain:.4g} C/A^2, tau={model.tau:.4g} s, ambient={model.ambient:.1f} C, saved to {args.output}')
@@ -0,0 +1,169 @@
+'''
+Ensemble averaging of repeated torque-displacement loops.
+
+record_torqueramp.py and record_max_torque.py repeat each torque ramp (0 -> +max -> 0 ->
+-max -> 0) and tag the repetitions with test_nr. Every repetition is split into loading
+(|torque| increasing) and unloading (|torque| decreasing) branches, using the commanded
+CONTROL_TORQUE so sensor noise does not split a branch. The branches of each type and
+torque sign, from any number of repetitions and files, are interpolated onto one torque
+grid in a single vectorized step, and averaged per grid point with a confidence band.
+Positive and negative branches are averaged apart, they meet at zero torque with the play
+in between. The grid of each side only spans the torque range all its branches cover:
+
+    average = ensemble_average([pd.read_csv(f) for f in files])
+    average['loading']      # TORQUE, DEFLECTION, STD, LOWER, UPPER, COUNT, negative side first
+
+The deflection is in output degrees, relative to the mean position of each repetition.
+Play and stiffness ramps have a different range and are best averaged separately, for
+example df[df['test_nr'] < 100] and df[df['test_nr'] >= 100].
+
+    python torque_loops.py test_data/<file>.csv [--test-nrs 100 101 102]
+'''
+
+import argparse
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+
+def split_branches(df, reference='CONTROL_TORQUE', group='test_nr'):
+    # branch number and loading flag per sample
+    if reference in df:
+        magnitude = df[reference].abs().to_numpy(dtype=float)
+    else:
+        magnitude = df['TORQUE'].rolling(25, center=True, min_periods=1).mean().abs().to_numpy()
+    groups = df[group].to_numpy() if group in df else np.zeros(len(df))
+
+    # a branch lasts as long as |torque| keeps changing in the same direction
+    change = np.sign(np.diff(magnitude, prepend=magnitude[0]))
+    loading = pd.Series(change).replace(0, np.nan).ffill().bfill().to_numpy() > 0
+    new_branch = np.concatenate(([True], (loading[1:] != loading[:-1]) | (groups[1:] != groups[:-1])))
+    return (np.cumsum(new_branch) - 1, loading)
+
+
+def deflection(df, group='test_nr'):
+    # output degrees, relative to the mean position of each repetition
+    position = df['POSITION'].to_numpy(dtype=float)
+    if group in df:
+        position = position - df.groupby(group)['POSITION'].transform('mean').to_numpy()
+    else:
+        position = position - position.mean()
+    return position * 360
+
+
+def interpolate_branches(branch, x, y, grid):
+    # y(grid) for every branch at once, nan outside the torque range of the branch.
+    # Sorted by (branch, x), the combined key branch*span + x is increasing, so one
+    # searchsorted finds the neighbours of every grid point in every branch.
+    (ids, branch) = np.unique(branch, return_inverse=True)
+    order = np.lexsort((x, branch))
+    (branch, x, y) = (branch[order], x[order], y[order])
+
+    x_min = min(x.min(), grid.min())
+    span = 2 * (max(x.max(), grid.max()) - x_min) + 1
+    key = branch * span + (x - x_min)
+    query = np.arange(len(ids))[:, np.newaxis] * span + (grid - x_min)
+
+    starts = np.searchsorted(branch, np.arange(len(ids)))[:, np.newaxis]
+    ends = np.searchsorted(branch, np.arange(len(ids)), side='right')[:, np.newaxis]
+    j = np.searchsorted(key, query)
+    valid = ((j > starts) & (j < ends)) | ((j == starts) & (key[np.minimum(j, len(key)-1)] == query))
+
+    j1 = np.minimum(j, len(key)-1)
+    j0 = np.maximum(j - 1, starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = np.where(key[j1] > key[j0], (query - key[j0]) / (key[j1] - key[j0]), 0.0)
+    values = y[j0] + w * (y[j1] - y[j0])
+    values[~valid] = np.nan
+    return (ids, values)
+
+
+def branch_statistics(values, grid, z):
+    # mean, standard deviation and confidence band over the branches (rows) of values
+    count = np.sum(np.isfinite(values), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.nansum(values, axis=0) / count
+        std = np.sqrt(np.nansum((values - mean)**2, axis=0) / (count - 1))
+    std[count < 2] = np.nan
+    mean[count == 0] = np.nan
+    band = z * std / np.sqrt(np.maximum(count, 1))
+    return pd.DataFrame({'TORQUE': grid, 'DEFLECTION': mean, 'STD': std,
+                         'LOWER': mean - band, 'UPPER': mean + band, 'COUNT': count})
+
+
+def ensemble_average(dfs, grid=None, num_points=200, torque='TORQUE', reference='CONTROL_TORQUE',
+                     group='test_nr', confidence=0.95, min_samples=10):
+    # mean deflection and confidence band per branch type, on a torque grid per side.
+    # num_points is split over the two sides, a given grid is clipped to each side
+    if isinstance(dfs, pd.DataFrame):
+        dfs = [dfs]
+
+    branches, loadings, torques, deflections = [], [], [], []
+    offset = 0
+    for df in dfs:
+        (branch, loading) = split_branches(df, reference, group)
+        branches.append(branch + offset)
+        loadings.append(loading)
+        torques.append(df[torque].to_numpy(dtype=float))
+        deflections.append(deflection(df, group))
+        offset += branch[-1] + 1 if len(branch) else 0
+    branch = np.concatenate(branches)
+    loading = np.concatenate(loadings)
+    x = np.concatenate(torques)
+    y = np.concatenate(deflections)
+
+    # short branches are turnarounds and noise, not part of a ramp
+    keep = (np.bincount(branch)[branch] >= min_samples) & np.isfinite(x) & np.isfinite(y)
+    (branch, loading, x, y) = (branch[keep], loading[keep], x[keep], y[keep])
+
+    # type, side and torque range per branch, the branch numbers are sorted
+    (ids, first) = np.unique(branch, return_index=True)
+    branch_loading = loading[first]
+    branch_positive = np.add.reduceat(x, first) > 0
+    branch_min = np.minimum.reduceat(x, first)
+    branch_max = np.maximum.reduceat(x, first)
+    index = np.searchsorted(ids, branch)
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    average = {}
+    for name, is_loading in (('loading', True), ('unloading', False)):
+        sides = []
+        for positive in (False, True):
+            members = (branch_loading == is_loading) & (branch_positive == positive)
+            (low, high) = (branch_min[members].max(initial=-np.inf), branch_max[members].min(initial=np.inf))
+            if not members.any() or low >= high:
+                continue
+            if grid is None:
+                side_grid = np.linspace(low, high, num_points // 2)
+            else:
+                side_grid = np.asarray(grid, dtype=float)
+                side_grid = side_grid[(side_grid >= low) & (side_grid <= high)]
+            rows = members[index]
+            (_, values) = interpolate_branches(branch[rows], x[rows], y[rows], side_grid)
+            sides.append(branch_statistics(values, side_grid, z))
+        average[name] = pd.concat(sides, ignore_index=True) if sides else branch_statistics(np.zeros((0, 0)), np.zeros(0), z)
+    return average
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Average the repeated torque ramps of recorded tests')
+    parser.add_argument('filenames', nargs='+')
+    parser.add_argument('--test-nrs', type=int, nargs='+', default=None, help='only these repetitions, default all')
+    parser.add_argument('--points', type=int, default=200, help='torque grid points')
+    args = parser.parse_args()
+
+    dfs = [pd.read_csv(filename) for filename in args.filenames]
+    if args.test_nrs is not None:
+        dfs = [df[df['test_nr'].isin(args.test_nrs)] for df in dfs]
+    average = ensemble_average(dfs, num_points=args.points)
+
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(1, 1, figsize=(7, 5))
+    for name, branch in average.items():
+        line, = ax.plot(branch['TORQUE'], branch['DEFLECTION'], label=f'{name}, max {branch["COUNT"].max()} ramps')
+        ax.fill_between(branch['TORQUE'], branch['LOWER'], branch['UPPER'], color=line.get_color(), alpha=0.3)
+    ax.legend()
+    ax.set_xlabel('Torque [Nm]')
+    ax.set_ylabel('Deflection [deg]')
+    plt.show()
@@ -0,0 +1,84 @@
+'''
+Opt-in latency tracing for the actuator transactions.
+
+Actuator.set_position is split into the phases 'encode' (building the CAN frame),
+'transport' (bus round trip) and 'parse' (decoding the reply), Actuator.state_to_dict
+is traced as 'state_to_dict'. Test scripts can add their own phases with record().
+
+Every traced phase keeps a call counter, total time and a histogram with power of two
+nanosecond bins, which costs only a few integer operations per call. The individual
+events are also kept (up to max_events) for export to CSV or to the Chrome trace
+format, which can be opened in chrome://tracing or https://ui.perfetto.dev
+
+Usage from a test script:
+    tracer = actuator.enable_tracing()
+    ...
+    tracer.print_summary()
+    tracer.to_chrome_trace('test_data/trace.json')
+'''
+
+import time
+import json
+
+
+class Tracer:
+    def __init__(self, max_events=1_000_000):
+        self.max_events = max_events
+        self.events = []
+        self.counts = {}
+        self.totals = {}
+        self.histograms = {}
+        self.start_ns = time.perf_counter_ns()
+
+    def record(self, phase, start_ns, end_ns):
+        duration = end_ns - start_ns
+        if phase not in self.counts:
+            self.counts[phase] = 0
+            self.totals[phase] = 0
+            self.histograms[phase] = [0] * 64
+        self.counts[phase] += 1
+        self.totals[phase] += duration
+        self.histograms[phase][max(duration, 1).bit_length() - 1] += 1
+
+        if len(self.events) < self.max_events:
+            self.events.append((phase, start_ns, duration))
+
+    def percentile(self, phase, pct):
+        # upper edge of the histogram bin that holds the given percentile, in ns
+        target = self.counts[phase] * pct / 100
+        seen = 0
+        for i, count in enumerate(self.histograms[phase]):
+            seen += count
+            if seen >= target:
+                return 2 ** (i+1)
+        return 2 ** 64
+
+    def print_summary(self):
+        elapsed = (time.perf_counter_ns() - self.start_ns) / 1e9
+        print(f'Trace summary over {elapsed:.1f}s:')
+        print(f'    {"phase":<16}{"count":>10}{"mean [us]":>12}{"p50 [us]":>12}{"p99 [us]":>12}{"share":>8}')
+        for phase in self.counts:
+            count = self.counts[phase]
+            mean = self.totals[phase] / count / 1e3
+            p50 = self.percentile(phase, 50) / 1e3
+            p99 = self.percentile(phase, 99) / 1e3
+            share = self.totals[phase] / 1e9 / elapsed * 100
+            print(f'    {phase:<16}{count:>10}{mean:>12.1f}{p50:>12.0f}{p99:>12.0f}{share:>7.1f}%')
+
+    def to_csv(self, filename):
+        with open(filename, 'w') as f:
+            f.write('PHASE,START_NS,DURATION_NS\n')
+            for phase, start, duration in self.events:
+                f.write(f'{phase},{start - self.start_ns},{duration}\n')
+
+    def to_chrome_trace(self, filename):
+        events = [{
+            'name': phase,
+            'ph': 'X',
+            'ts': (start - self.start_ns) / 1e3,
+            'dur': duration / 1e3,
+            'pid': 0,
+            'tid': 0,
+        } for phase, start, duration in self.events]
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
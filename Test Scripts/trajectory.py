@@ -0,0 +1,130 @@
+'''
+Host side trajectory planning and streaming.
+
+Instead of sending one waypoint at a time and polling TRAJECTORY_COMPLETE, the waypoint
+commands (same dicts as used by record_trajectory.py) are turned into one continuous
+position/velocity/torque stream, which is played out at the control rate.
+
+Consecutive waypoints in the same direction are merged into one move, which passes the
+intermediate waypoints at speed instead of stopping at each of them. Each move gets a
+trapezoidal velocity profile within the lowest velocity_limit and accel_limit of its
+waypoints. The whole stream is then filtered with a moving average of length
+2*accel_limit/jerk_limit, which limits the jerk and blends the reversals, so the next
+move starts while the previous one is still settling.
+
+The stream is sent without accel_limit and velocity_limit, so servo.default_accel_limit
+and servo.default_velocity_limit should be nan (the moteus default) on the controller,
+otherwise the controller will reshape the stream with its own limits.
+'''
+
+import math
+
+import numpy as np
+import pandas as pd
+
+
+# velocity samples of a trapezoidal (or triangular) move over a distance, at rate [Hz]
+def trapezoid_move(distance, velocity_limit, accel_limit, rate):
+    d = abs(distance)
+    if d == 0:
+        return np.zeros(0)
+
+    v_peak = min(velocity_limit, math.sqrt(d * accel_limit))
+    t_accel = v_peak / accel_limit
+    t_total = 2*t_accel + (d - v_peak*t_accel) / v_peak
+
+    t = (np.arange(math.ceil(t_total * rate)) + 0.5) / rate
+    v = np.minimum.reduce([accel_limit * t, np.full_like(t, v_peak), accel_limit * (t_total - t)])
+    v = np.maximum(v, 0)
+
+    # correct for the discretisation so the move ends exactly on the waypoint
+    v *= d / (v.sum() / rate)
+    return math.copysign(1, distance) * v
+
+
+# the waypoint commands as moves between direction reversals, list of dicts with
+# 'distance', 'velocity_limit' and 'accel_limit'
+def merge_moves(commands, start_position):
+    moves = []
+    position = start_position
+    for command in commands:
+        distance = command['position'] - position
+        position = command['position']
+        if distance == 0:
+            continue
+        if moves and (distance > 0) == (moves[-1]['distance'] > 0):
+            move = moves[-1]
+            move['distance'] += distance
+            move['velocity_limit'] = min(move['velocity_limit'], command['velocity_limit'])
+            move['accel_limit'] = min(move['accel_limit'], command['accel_limit'])
+        else:
+            moves.append({'distance': distance, 'velocity_limit': command['velocity_limit'],
+                          'accel_limit': command['accel_limit']})
+    return moves
+
+
+# commands: list of dicts with 'position', 'accel_limit' and 'velocity_limit' in output
+# rev, rev/s^2 and rev/s. jerk_limit in rev/s^3, inertia in kg m^2 at the output for the
+# torque feedforward, dwell is the time [s] to rest at each direction reversal.
+def plan_trajectory(commands, start_position, jerk_limit=200.0, rate=1000, inertia=0.0, dwell=0.0):
+    velocities = []
+    for move in merge_moves(commands, start_position):
+        velocities.append(trapezoid_move(move['distance'], move['velocity_limit'], move['accel_limit'], rate))
+        velocities.append(np.zeros(int(dwell * rate)))
+
+    # moving average to limit jerk. Between two moves the acceleration can step from
+    # -accel_limit to +accel_limit, so the window has to cover twice the highest limit
+    max_accel = max(command['accel_limit'] for command in commands)
+    window = max(1, math.ceil(2 * max_accel / jerk_limit * rate))
+    velocity = np.concatenate(velocities + [np.zeros(window)])
+    velocity = np.convolve(velocity, np.ones(window) / window)[:len(velocity)]
+
+    position = start_position + np.cumsum(velocity) / rate
+    acceleration = np.gradient(velocity) * rate
+
+    return pd.DataFrame({
+        'TIME': np.arange(len(velocity)) / rate,
+        'POSITION': position,
+        'VELOCITY': velocity,
+        'ACCELERATION': acceleration,
+        'FEEDFORWARD_TORQUE': inertia * acceleration * 2*math.pi,
+    })
+
+
+async def stream_trajectory(actuator, plan, settle_time=0.5):
+    # play out the planned trajectory, indexed by elapsed time so a slow cycle skips
+    # samples instead of stretching the trajectory
+    position = plan['POSITION'].to_numpy()
+    velocity = plan['VELOCITY'].to_numpy()
+    torque = plan['FEEDFORWARD_TORQUE'].to_numpy()
+    rate = 1 / (plan['TIME'].iloc[1] - plan['TIME'].iloc[0])
+    end = len(plan) - 1
+
+    states = []
+    start_time = actuator.clock.monotonic_ns()
+    print_progress = 0.1
+    while True:
+        t = (actuator.clock.monotonic_ns() - start_time) / 1e9
+        i = min(int(t * rate), end)
+        if i == end and t > plan['TIME'].iloc[-1] + settle_time:
+            break
+        if i / end > print_progress:
+            print(f'{i/end*100:.0f}% done')
+            print_progress += 0.1
+
+        result = await actuator.set_position(position=position[i], velocity=velocity[i], feedforward_torque=torque[i])
+        state = actuator.state_to_dict(result, actuator.clock.monotonic_ns())
+        state['PLAN_POSITION'] = position[i]
+        states.append(state)
+
+        if state['FAULT'] != 0:
+            print(f'Fault detected: {state["FAULT"]}')
+            break
+
+        await actuator.clock.sleep(0.0005)
+
+    await actuator.slow_down()
+    await actuator.m.set_stop()
+
+    df = pd.DataFrame(states)
+    return df